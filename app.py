@@ -1,40 +1,37 @@
 import sqlite3
 import os
+import queue
 import time
 import logging
 import streamlit as st
 import pandas as pd
-import requests
-import re
 from datetime import datetime
 import base64
-from dotenv import load_dotenv
-import folium
 from io import BytesIO
-from PIL import Image
-from bs4 import BeautifulSoup
-import phonenumbers  # For phone number validation
-
-# Load environment variables
-load_dotenv()
-
-# RapidAPI key for Local Business Data API
-RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY", "4028e8ecb3mshc7917ff39380476p12eeefjsn1f86bf9f2996")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+import rate_limiter
+import http_cache
+import http_client
+import batch
+import entities
+import exporters
+import scraper_core
+from records import RecordColumns
+from storage import DATA_DIR
+from scraper_core import fetch_osm_elements, iter_enriched_businesses, fetch_osm_businesses
 
 # Set page config to ensure consistent theme
 st.set_page_config(page_title="Business Scraper", page_icon="🗺️", layout="wide")
 
 # Set up logging
 logging.basicConfig(
-    filename=os.path.join('/tmp' if os.getenv('RENDER') else '.', 'app.log'),
+    filename=os.path.join(DATA_DIR, 'app.log'),
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
 # Initialize SQLite database for search history
 def init_db():
-    db_path = os.path.join('/tmp' if os.getenv('RENDER') else '.', 'search_history.db')
+    db_path = os.path.join(DATA_DIR, 'search_history.db')
     conn = sqlite3.connect(db_path)
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS searches (id INTEGER PRIMARY KEY AUTOINCREMENT, search_term TEXT, timestamp TEXT)''')
@@ -43,7 +40,7 @@ def init_db():
 
 # Add a search term to the history
 def add_search_to_history(search_term):
-    db_path = os.path.join('/tmp' if os.getenv('RENDER') else '.', 'search_history.db')
+    db_path = os.path.join(DATA_DIR, 'search_history.db')
     conn = sqlite3.connect(db_path)
     c = conn.cursor()
     timestamp = datetime.now().strftime("%Y-%m-d %H:%M:%S")
@@ -54,7 +51,7 @@ def add_search_to_history(search_term):
 # Get the last 10 search terms
 def get_search_history():
     try:
-        db_path = os.path.join('/tmp' if os.getenv('RENDER') else '.', 'search_history.db')
+        db_path = os.path.join(DATA_DIR, 'search_history.db')
         conn = sqlite3.connect(db_path)
         c = conn.cursor()
         c.execute("SELECT search_term, timestamp FROM searches ORDER BY timestamp DESC LIMIT 10")
@@ -66,7 +63,7 @@ def get_search_history():
 
 # Clear search history
 def clear_search_history():
-    db_path = os.path.join('/tmp' if os.getenv('RENDER') else '.', 'search_history.db')
+    db_path = os.path.join(DATA_DIR, 'search_history.db')
     conn = sqlite3.connect(db_path)
     c = conn.cursor()
     c.execute("DELETE FROM searches")
@@ -82,502 +79,31 @@ def export_search_history():
         return csv
     return None
 
-# Clean up old files (older than 1 hour)
-def cleanup_old_files():
-    current_time = time.time()
-    for filename in os.listdir('.'):
-        if filename.startswith('business_data_') and (filename.endswith('.csv') or filename.endswith('.xlsx')):
-            file_path = os.path.join('.', filename)
-            file_age = current_time - os.path.getmtime(file_path)
-            if file_age > 3600:  # 1 hour in seconds
-                try:
-                    os.remove(file_path)
-                    logging.info(f"Deleted old file: {file_path}")
-                except Exception as e:
-                    logging.error(f"Error deleting file {file_path}: {e}")
-
-# Rate limiting for Nominatim API (1 request per second)
-if "last_nominatim_request" not in st.session_state:
-    st.session_state.last_nominatim_request = 0
-NOMINATIM_COOLDOWN = 1  # 1 second cooldown
-
-# Rate limiting for website scraping (1 request per second)
-if "last_website_request" not in st.session_state:
-    st.session_state.last_website_request = 0
-WEBSITE_COOLDOWN = 1  # 1 second cooldown
-
-# Rate limiting for Local Business Data API (1 request per second)
-if "last_local_business_request" not in st.session_state:
-    st.session_state.last_local_business_request = 0
-LOCAL_BUSINESS_COOLDOWN = 1  # 1 second cooldown
-
-# Validate phone number using phonenumbers module
-def validate_phone_number(phone):
-    if phone == "N/A":
-        return "N/A"
-    try:
-        parsed_number = phonenumbers.parse(phone, "PK")
-        if phonenumbers.is_valid_number(parsed_number):
-            return phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.INTERNATIONAL)
-        else:
-            return "Invalid"
-    except phonenumbers.NumberParseException:
-        return "Invalid"
-
-# Hardcoded coordinates for major Pakistani cities as a fallback
-CITY_COORDINATES = {
-    "karachi": {"center": [24.8607, 67.0011], "bbox": "24.5,66.8,25.2,67.2"},
-    "lahore": {"center": [31.5497, 74.3436], "bbox": "31.2,74.1,31.8,74.5"},
-    "islamabad": {"center": [33.6844, 73.0479], "bbox": "33.5,72.8,33.8,73.2"},
-    "sukkur": {"center": [27.7052, 68.8574], "bbox": "27.5,68.6,27.9,69.0"}
-}
+# Pooled keep-alive HTTP session shared by every rerun and session
+@st.cache_resource
+def get_http_session():
+    return http_client.build_session()
 
-# Get bounding box and center for a city using Nominatim API
-def get_city_bbox(city_name):
-    # Check if city is in hardcoded coordinates
-    city_key = city_name.lower()
-    if city_key in CITY_COORDINATES:
-        logging.info(f"Using hardcoded coordinates for {city_name}")
-        return CITY_COORDINATES[city_key]["bbox"], CITY_COORDINATES[city_key]["center"]
-
-    current_time = time.time()
-    if current_time - st.session_state.last_nominatim_request < NOMINATIM_COOLDOWN:
-        time.sleep(NOMINATIM_COOLDOWN - (current_time - st.session_state.last_nominatim_request))
-    
-    nominatim_url = "https://nominatim.openstreetmap.org/search"
-    headers = {"User-Agent": "BusinessScraperApp/1.0"}
-    
-    # List of queries to try
-    queries = [
-        city_name,                    # e.g., "sukkur"
-        f"{city_name}, Pakistan",     # e.g., "sukkur, Pakistan"
-        f"{city_name}, Sindh"         # e.g., "sukkur, Sindh"
-    ]
-    
-    for i, query in enumerate(queries):
-        params = {
-            "q": query,
-            "format": "json",
-            "bounded": "1",
-            "limit": "1",
-        }
-        
-        try:
-            response = requests.get(nominatim_url, params=params, headers=headers, timeout=5)
-            st.session_state.last_nominatim_request = time.time()
-            response.raise_for_status()
-            data = response.json()
-            
-            logging.info(f"Nominatim API response for query '{query}' (attempt {i+1}): {data}")
-            
-            if not data or not isinstance(data, list):
-                logging.warning(f"No valid data returned from Nominatim for query '{query}'")
-                continue
-            
-            # Find a result that matches the city name and is in Pakistan
-            for entry in data:
-                display_name = entry.get("display_name", "").lower()
-                # Check if the city name is in the display name and it's in Pakistan
-                if city_name.lower() in display_name and "pakistan" in display_name:
-                    bbox = entry.get("boundingbox")
-                    if bbox:
-                        south, north, west, east = map(float, bbox)
-                        bbox_str = f"{south},{west},{north},{east}"
-                        center = [float(entry.get("lat")), float(entry.get("lon"))]
-                        logging.info(f"Found city {city_name} with display_name: {display_name}")
-                        return bbox_str, center
-                    else:
-                        logging.warning(f"No bounding box found for city {city_name} in entry: {entry}")
-            
-            logging.info(f"No matching city found for query '{query}'")
-        
-        except requests.RequestException as e:
-            logging.error(f"Error fetching city bbox from Nominatim for query '{query}': {str(e)}")
-            st.session_state.last_nominatim_request = time.time()
-            continue
-    
-    # If all Nominatim queries fail, fall back to hardcoded coordinates
-    logging.warning(f"All Nominatim queries failed for {city_name}. Falling back to hardcoded coordinates.")
-    if city_key in CITY_COORDINATES:
-        logging.info(f"Using hardcoded coordinates for {city_name} as final fallback")
-        return CITY_COORDINATES[city_key]["bbox"], CITY_COORDINATES[city_key]["center"]
-    
-    logging.error(f"City {city_name} not found after all attempts and no hardcoded coordinates available.")
-    return None, None
-
-# Search for businesses using Local Business Data API
-def search_local_business(business_name, business_type, city):
-    current_time = time.time()
-    if current_time - st.session_state.last_local_business_request < LOCAL_BUSINESS_COOLDOWN:
-        time.sleep(LOCAL_BUSINESS_COOLDOWN - (current_time - st.session_state.last_local_business_request))
-    
-    url = "https://local-business-data.p.rapidapi.com/search"
-    # Ensure the query is specific to hospitals in the specified city
-    query = f"{business_name} {business_type} {city}" if business_type else f"{business_name} {city}"
-    querystring = {
-        "query": query,
-        "limit": "1",
-        "language": "en"
-    }
-    headers = {
-        "X-RapidAPI-Key": RAPIDAPI_KEY,
-        "X-RapidAPI-Host": "local-business-data.p.rapidapi.com"
-    }
-    
-    try:
-        response = requests.get(url, headers=headers, params=querystring, timeout=5)
-        st.session_state.last_local_business_request = time.time()
-        if response.status_code == 429:
-            logging.error("RapidAPI quota exceeded for Local Business Data API.")
-            st.error("API quota exceeded. Please wait for the quota to reset or upgrade to a paid plan on RapidAPI.")
-            return None, None, None, None, None
-        response.raise_for_status()
-        data = response.json()
-        
-        logging.info(f"Local Business Data API search response for {business_name} in {city}: {data}")
-        
-        if not data.get("data") or not isinstance(data["data"], list):
-            logging.warning(f"No valid data returned from Local Business Data API for {business_name} in {city}")
-            return None, "N/A", "N/A", "N/A", "N/A"
-        
-        if not data["data"]:
-            logging.warning(f"Empty data list returned from Local Business Data API for {business_name} in {city}")
-            return None, "N/A", "N/A", "N/A", "N/A"
-        
-        business = data["data"][0]
-        if not isinstance(business, dict):
-            logging.warning(f"Invalid business entry (not a dictionary) for {business_name} in {city}: {business}")
-            return None, "N/A", "N/A", "N/A", "N/A"
-        
-        # Verify that the result is a hospital in the specified city
-        name = business.get("name", "").lower()
-        address = business.get("address", "").lower()
-        if business_type == "hospitals" and "hospital" not in name and "hospital" not in address:
-            logging.warning(f"Business {name} does not appear to be a hospital: {business}")
-            return None, "N/A", "N/A", "N/A", "N/A"
-        if city.lower() not in address:
-            logging.warning(f"Business {name} is not in {city}: {address}")
-            return None, "N/A", "N/A", "N/A", "N/A"
-        
-        business_id = business.get("business_id")
-        phone = business.get("phone_number", "N/A")
-        email = business.get("email", "N/A")
-        opening_hours = business.get("business_hours", "N/A")
-        if opening_hours != "N/A" and isinstance(opening_hours, dict):
-            hours_str = []
-            for day, times in opening_hours.items():
-                hours_str.append(f"{day}: {times}")
-            opening_hours = "; ".join(hours_str)
-        website = business.get("website", "N/A")
-        
-        phone = validate_phone_number(phone)
-        return business_id, phone, email, opening_hours, website
-    
-    except requests.RequestException as e:
-        logging.error(f"Error searching Local Business Data API for {business_name} in {city}: {str(e)}")
-        st.session_state.last_local_business_request = time.time()
-        return None, "N/A", "N/A", "N/A", "N/A"
-
-# Fetch business details using Local Business Data API
-def fetch_local_business_details(business_id):
-    if not business_id:
-        return "N/A", "N/A", "N/A", "N/A"
-    
-    current_time = time.time()
-    if current_time - st.session_state.last_local_business_request < LOCAL_BUSINESS_COOLDOWN:
-        time.sleep(LOCAL_BUSINESS_COOLDOWN - (current_time - st.session_state.last_local_business_request))
-    
-    url = "https://local-business-data.p.rapidapi.com/business-details"
-    querystring = {
-        "business_id": business_id,
-        "extract_emails_and_contacts": "true",
-        "extract_share_link": "false",
-        "language": "en"
-    }
-    headers = {
-        "X-RapidAPI-Key": RAPIDAPI_KEY,
-        "X-RapidAPI-Host": "local-business-data.p.rapidapi.com"
-    }
-    
-    try:
-        response = requests.get(url, headers=headers, params=querystring, timeout=5)
-        st.session_state.last_local_business_request = time.time()
-        if response.status_code == 429:
-            logging.error("RapidAPI quota exceeded for Local Business Data API.")
-            st.error("API quota exceeded. Please wait for the quota to reset or upgrade to a paid plan on RapidAPI.")
-            return "N/A", "N/A", "N/A", "N/A"
-        response.raise_for_status()
-        data = response.json()
-        
-        logging.info(f"Local Business Data API response for business_id {business_id}: {data}")
-        
-        if not data.get("data"):
-            logging.warning(f"No business details found for business_id {business_id}")
-            return "N/A", "N/A", "N/A", "N/A"
-        
-        business = data["data"]
-        if not isinstance(business, dict):
-            logging.warning(f"Invalid business details (not a dictionary) for business_id {business_id}: {business}")
-            return "N/A", "N/A", "N/A", "N/A"
-        
-        phone = business.get("phone_number", "N/A")
-        email = business.get("email", "N/A")
-        opening_hours = business.get("business_hours", "N/A")
-        if opening_hours != "N/A" and isinstance(opening_hours, dict):
-            hours_str = []
-            for day, times in opening_hours.items():
-                hours_str.append(f"{day}: {times}")
-            opening_hours = "; ".join(hours_str)
-        website = business.get("website", "N/A")
-        
-        phone = validate_phone_number(phone)
-        return phone, email, opening_hours, website
-    
-    except requests.RequestException as e:
-        logging.error(f"Error fetching Local Business Data API details for business_id {business_id}: {str(e)}")
-        st.session_state.last_local_business_request = time.time()
-        return "N/A", "N/A", "N/A", "N/A"
-
-# Fetch reviews using Google Places API (optional, requires GOOGLE_API_KEY)
-def fetch_google_reviews(business_name, city):
-    if not GOOGLE_API_KEY:
-        logging.info("Google API key not found. Skipping reviews.")
-        return "N/A"
-
-    if "last_google_request" not in st.session_state:
-        st.session_state.last_google_request = 0
-    GOOGLE_COOLDOWN = 1
-
-    current_time = time.time()
-    if current_time - st.session_state.last_google_request < GOOGLE_COOLDOWN:
-        time.sleep(GOOGLE_COOLDOWN - (current_time - st.session_state.last_google_request))
-
-    search_url = "https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
-    search_params = {
-        "input": f"{business_name} {city}",
-        "inputtype": "textquery",
-        "fields": "place_id",
-        "key": GOOGLE_API_KEY
-    }
-
-    try:
-        response = requests.get(search_url, params=search_params, timeout=5)
-        st.session_state.last_google_request = time.time()
-        response.raise_for_status()
-        search_data = response.json()
-
-        logging.info(f"Google Places search response for {business_name} in {city}: {search_data}")
-
-        if search_data.get("status") != "OK" or not search_data.get("candidates"):
-            logging.warning(f"No place found for {business_name} in {city} using Google Places API")
-            return "N/A"
-
-        place_id = search_data["candidates"][0]["place_id"]
-
-        details_url = "https://maps.googleapis.com/maps/api/place/details/json"
-        details_params = {
-            "place_id": place_id,
-            "fields": "reviews",
-            "key": GOOGLE_API_KEY
-        }
-
-        response = requests.get(details_url, params=details_params, timeout=5)
-        st.session_state.last_google_request = time.time()
-        response.raise_for_status()
-        details_data = response.json()
-
-        logging.info(f"Google Places details response for place_id {place_id}: {details_data}")
-
-        if details_data.get("status") != "OK" or not details_data.get("result"):
-            logging.warning(f"No details found for place_id {place_id} using Google Places API")
-            return "N/A"
-
-        reviews = details_data["result"].get("reviews", [])
-        if not reviews:
-            return "No reviews available"
-
-        review_texts = []
-        for review in reviews[:3]:
-            author = review.get("author_name", "Anonymous")
-            rating = review.get("rating", "N/A")
-            text = review.get("text", "No comment")
-            review_texts.append(f"{author} (Rating: {rating}/5): {text}")
-        
-        return "; ".join(review_texts)
+scraper_core.set_http_session(get_http_session())
 
-    except requests.RequestException as e:
-        logging.error(f"Error fetching Google Places data for {business_name} in {city}: {str(e)}")
-        st.session_state.last_google_request = time.time()
-        return "N/A"
+# Warnings raised by the scraping core (possibly from worker threads), shown by the script thread
+notices = queue.Queue()
+scraper_core.set_notifier(lambda level, message: notices.put((level, message)))
 
-# Scrape email, phone, and opening hours from a website
-def scrape_website(website_url):
-    if not website_url or website_url == "N/A":
-        return "N/A", "N/A", "N/A"
-    
-    current_time = time.time()
-    if current_time - st.session_state.last_website_request < WEBSITE_COOLDOWN:
-        time.sleep(WEBSITE_COOLDOWN - (current_time - st.session_state.last_website_request))
-    
-    try:
-        headers = {"User-Agent": "BusinessScraperApp/1.0 (Mozilla/5.0; compatible)"}
-        response = requests.get(website_url, headers=headers, timeout=5)
-        st.session_state.last_website_request = time.time()
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, "html.parser")
-        text = soup.get_text()
-        
-        email_pattern = r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}(?:\.[a-zA-Z]{2,})?"
-        emails = re.findall(email_pattern, text)
-        email = "N/A"
-        if emails:
-            for e in emails:
-                if "contact" in e.lower() or "info" in e.lower() or "support" in e.lower():
-                    email = e
-                    break
-            if email == "N/A":
-                email = emails[0]
-        
-        phone_pattern = r"(\+\d{1,3}\s?\d{1,4}\s?\d{6,10}|\d{3}-\d{3}-\d{4}|\d{10,12}|0\d{2,3}-\d{7,8})"
-        phones = re.findall(phone_pattern, text)
-        phone = validate_phone_number(phones[0]) if phones else "N/A"
-        
-        hours_pattern = r"(?:(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun|Mo-Fr|Mo-Su)\s*(?:-)?\s*(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun)?\s*\d{1,2}:\d{2}\s*-\s*\d{1,2}:\d{2})|(?:Open\s*\d{1,2}\s*(?:AM|PM)\s*to\s*\d{1,2}\s*(?:AM|PM))"
-        hours = re.search(hours_pattern, text, re.IGNORECASE)
-        opening_hours = hours.group(0) if hours else "N/A"
-        
-        return email, phone, opening_hours
-    
-    except requests.RequestException as e:
-        logging.error(f"Error scraping website {website_url}: {str(e)}")
-        st.session_state.last_website_request = time.time()
-        return "N/A", "N/A", "N/A"
-
-# Fetch business data using OpenStreetMap Overpass API for a specific city
-def fetch_osm_businesses(search_term, num_to_fetch):
-    overpass_url = "http://overpass-api.de/api/interpreter"
-    terms = search_term.lower().split()
-    if len(terms) < 2:
-        return [], None
-    city = terms[0]  # e.g., "sukkur"
-    business_type = terms[-1]  # e.g., "hospitals"
-    
-    bbox, center = get_city_bbox(city)
-    if not bbox or not center:
-        return [], None
-    
-    osm_tags = {
-        "schools": 'node["amenity"="school"]',
-        "restaurants": 'node["amenity"="restaurant"]',
-        "hospitals": 'node["amenity"="hospital"]'
-    }
-    tag = osm_tags.get(business_type, 'node["amenity"]')
-    query = f"""
-    [out:json][timeout:30];
-    (
-      {tag}({bbox});
-    );
-    out body;
-    """
-    try:
-        response = requests.get(overpass_url, params={'data': query}, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        
-        logging.info(f"Overpass API response: {data}")
-        
-        if 'elements' not in data or not isinstance(data['elements'], list):
-            logging.error("Overpass API response does not contain 'elements' or 'elements' is not a list")
-            return [], center
-        
-        businesses = []
-        for element in data['elements'][:num_to_fetch]:
-            if not isinstance(element, dict):
-                logging.warning(f"Skipping invalid element (not a dictionary): {element}")
-                continue
-            
-            tags = element.get('tags', {})
-            logging.info(f"Raw OSM tags for {tags.get('name', 'Unknown')}: {tags}")
-            
-            name = tags.get('name', 'Unknown').lower()
-            lat = element.get('lat', 'N/A')
-            lon = element.get('lon', 'N/A')
-            phone = tags.get('phone', 'N/A')
-            email = tags.get('email', 'N/A')
-            opening_hours = tags.get('opening_hours', 'N/A')
-            website = tags.get('website', 'N/A')
-            
-            # Strict filtering to ensure correct business type
-            actual_type = tags.get('amenity', '').lower()
-            if business_type == "hospitals" and actual_type != "hospital":
-                logging.info(f"Skipping {name} - not a hospital (amenity: {actual_type})")
-                continue
-            if business_type == "restaurants" and actual_type != "restaurant":
-                logging.info(f"Skipping {name} - not a restaurant (amenity: {actual_type})")
-                continue
-            if business_type == "schools" and actual_type != "school":
-                logging.info(f"Skipping {name} - not a school (amenity: {actual_type})")
-                continue
-            
-            # Additional check to ensure the business is a hospital based on name
-            if business_type == "hospitals" and "hospital" not in name:
-                logging.info(f"Skipping {name} - name does not contain 'hospital'")
-                continue
-            
-            # Use Local Business Data API to fetch phone, email, opening hours, and website
-            if phone == "N/A" or email == "N/A" or opening_hours == "N/A" or website == "N/A":
-                business_id, local_phone, local_email, local_hours, local_website = search_local_business(name, business_type, city)
-                if business_id is None:
-                    st.warning(f"Could not find {name} in {city} using the Local Business Data API. Trying a simpler query...")
-                    business_id, local_phone, local_email, local_hours, local_website = search_local_business(name, "", city)
-                
-                phone = local_phone if phone == "N/A" and local_phone != "N/A" else phone
-                email = local_email if email == "N/A" and local_email != "N/A" else email
-                opening_hours = local_hours if opening_hours == "N/A" and local_hours != "N/A" else opening_hours
-                website = local_website if website == "N/A" and local_website != "N/A" else website
-                
-                if (phone == "N/A" or email == "N/A" or opening_hours == "N/A" or website == "N/A") and business_id:
-                    local_phone, local_email, local_hours, local_website = fetch_local_business_details(business_id)
-                    phone = local_phone if phone == "N/A" and local_phone != "N/A" else phone
-                    email = local_email if email == "N/A" and local_email != "N/A" else email
-                    opening_hours = local_hours if opening_hours == "N/A" and local_hours != "N/A" else opening_hours
-                    website = local_website if website == "N/A" and local_website != "N/A" else website
-                else:
-                    st.warning(f"No additional data found for {name} in {city} using the Local Business Data API. Falling back to website scraping or assumed hours.")
-            
-            if (email == "N/A" or phone == "N/A" or opening_hours == "N/A") and website != "N/A":
-                scraped_email, scraped_phone, scraped_hours = scrape_website(website)
-                email = scraped_email if email == "N/A" and scraped_email != "N/A" else email
-                phone = scraped_phone if phone == "N/A" and scraped_phone != "N/A" else phone
-                opening_hours = scraped_hours if opening_hours == "N/A" and scraped_hours != "N/A" else opening_hours
-            
-            if opening_hours == "N/A":
-                if business_type == "hospitals":
-                    opening_hours = "9:00 AM - 5:00 PM (assumed, please verify)"
-                elif business_type == "restaurants":
-                    opening_hours = "11:00 AM - 11:00 PM (assumed, please verify)"
-            
-            reviews_comments = fetch_google_reviews(name, city)
-            
-            businesses.append({
-                'name': name,
-                'latitude': lat,
-                'longitude': lon,
-                'phone': phone,
-                'email': email,
-                'opening_hours': opening_hours,
-                'website': website,
-                'reviews_comments': reviews_comments
-            })
-        return businesses, center
-    except requests.RequestException as e:
-        logging.error(f"Error fetching OSM data: {str(e)}")
-        return [], center
+# Show queued scraping notices on the page
+def show_notices():
+    while not notices.empty():
+        level, message = notices.get()
+        if level == "error":
+            st.error(message)
+        else:
+            st.warning(message)
 
 # Get a static map image using OpenStreetMap and folium
 def get_static_map(search_term, center):
     try:
+        import folium  # imported lazily; only needed once a map is requested
+        from PIL import Image
         if center is None:
             return None
         m = folium.Map(location=center, zoom_start=12)
@@ -599,14 +125,22 @@ def load_local_image(image_path):
         encoded_string = base64.b64encode(image_file.read()).decode()
     return f"data:image/png;base64,{encoded_string}"
 
-# Rate limiting for Overpass API
+# Theme toggle in session state
+if "theme" not in st.session_state:
+    st.session_state.theme = "light"
+
+# Cooldown between the Fetch Data / Run Batch clicks of one session; upstream calls are paced by rate_limiter
 if "last_scrape_time" not in st.session_state:
     st.session_state.last_scrape_time = 0
 SCRAPE_COOLDOWN = 60  # 60 seconds cooldown
 
-# Theme toggle in session state
-if "theme" not in st.session_state:
-    st.session_state.theme = "light"
+# Seconds this session still has to wait; starts a new cooldown when there is none left
+def start_scrape_cooldown():
+    remaining = SCRAPE_COOLDOWN - (time.time() - st.session_state.last_scrape_time)
+    if remaining > 0:
+        return remaining
+    st.session_state.last_scrape_time = time.time()
+    return 0
 
 # Initialize the database
 init_db()
@@ -645,6 +179,26 @@ with st.sidebar:
                 mime="text/csv"
             )
 
+    with st.expander("Rate Limits"):
+        limiter_stats = rate_limiter.limiter.stats()
+        if limiter_stats:
+            st.write(f"Total time spent waiting: {rate_limiter.limiter.total_wait_seconds()} s")
+            st.dataframe(pd.DataFrame.from_dict(limiter_stats, orient="index"), use_container_width=True)
+        else:
+            st.write("No upstream requests yet.")
+
+    with st.expander("Response Cache"):
+        cache_stats = http_cache.cache.stats()
+        st.write(f"Hits: {cache_stats['hits']} | Misses: {cache_stats['misses']} | Hit rate: {cache_stats['hit_rate']:.0%}")
+        st.write(f"Entries: {cache_stats['entries']} ({cache_stats['bytes'] / 1024:.0f} KB)")
+        if cache_stats["endpoints"]:
+            st.dataframe(pd.DataFrame.from_dict(cache_stats["endpoints"], orient="index"), use_container_width=True)
+        page_stats = http_cache.pages.stats()
+        st.write(f"Website pages: {page_stats['hits']} of {page_stats['requests']} unchanged ({page_stats['hit_rate']:.0%}), "
+                 f"{page_stats['bytes_saved'] / 1024:.0f} KB saved")
+        entity_stats = entities.index.stats()
+        st.write(f"Known businesses: {entity_stats['entities']} | Enrichments skipped: {entity_stats['enrichments_skipped']}")
+
     with st.expander("How to Use"):
         st.write("""
         1. Enter a search term (e.g., "karachi hospitals").
@@ -726,7 +280,7 @@ with col1:
 with col2:
     num_to_fetch = st.number_input("Number of Businesses", min_value=1, max_value=50, value=5)
 
-# Fetch data button with loading animation
+# Fetch data button with live progress
 if st.button("Fetch Data"):
     # Input validation
     if not search_term:
@@ -734,83 +288,128 @@ if st.button("Fetch Data"):
     elif num_to_fetch < 1 or num_to_fetch > 50:
         st.error("Number of businesses to fetch must be between 1 and 50.")
     else:
-        # Rate limiting for Overpass API
-        current_time = time.time()
-        if current_time - st.session_state.last_scrape_time < SCRAPE_COOLDOWN:
-            st.error(f"Please wait {int(SCRAPE_COOLDOWN - (current_time - st.session_state.last_scrape_time))} seconds before fetching again.")
+        # Rate limiting for searches, per session
+        wait_seconds = start_scrape_cooldown()
+        if wait_seconds > 0:
+            st.error(f"Please wait {int(wait_seconds) + 1} seconds before fetching again.")
+        else:
+            try:
+                logging.info(f"User searched for: '{search_term}' with {num_to_fetch} businesses")
+
+                # Resolve the city and fetch candidate businesses from the Overpass API
+                with st.spinner("Looking up the city and querying OpenStreetMap..."):
+                    elements, business_type, city, center, stage_timings = fetch_osm_elements(search_term, num_to_fetch)
+
+                # Check if city was found and candidates were fetched
+                if center is None:
+                    st.error("City not found in Pakistan. Please try a different city (e.g., 'karachi', 'lahore', 'islamabad').")
+                    st.stop()
+
+                # Stream enriched businesses into the table as they finish, keeping the original order
+                with st.expander("Business Results", expanded=True):
+                    st.subheader("Fetched Businesses")
+                    progress_bar = st.progress(0.0, text=f"Enriching 0 of {len(elements)} businesses...")
+                    table_placeholder = st.empty()
+                    rows = {}
+                    enrich_timings = {}
+                    pages_before = http_cache.pages.stats()
+                    for done, (index, business, timings) in enumerate(iter_enriched_businesses(elements, business_type, city), start=1):
+                        for stage, seconds in timings.items():
+                            enrich_timings.setdefault(stage, []).append(seconds)
+                        if business is not None:
+                            rows[index] = business
+                            table_placeholder.dataframe(RecordColumns([rows[i] for i in sorted(rows)], scraper_core.EXPORT_COLUMNS).to_dataframe(),
+                                                        use_container_width=True)
+                        show_notices()
+                        progress_bar.progress(done / len(elements), text=f"Enriched {done} of {len(elements)} businesses")
+                    progress_bar.empty()
+                businesses = [rows[i] for i in sorted(rows)]
+                show_notices()
+
+                if not businesses:
+                    st.error("No businesses were fetched. Try a different business type (e.g., 'hospitals', 'restaurants') or city.")
+                    st.stop()
+
+                # Add to search history
+                add_search_to_history(search_term)
+
+                # Display summary
+                st.success(f"Found {len(businesses)} businesses for '{search_term}' in {city.title()}")
+
+                # Kept for the download section, which builds the file in memory when asked
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                st.session_state["last_results"] = (RecordColumns(businesses, scraper_core.EXPORT_COLUMNS).to_dataframe(),
+                                                    f"business_data_{timestamp}")
+
+                # Updated note about data enrichment and free plan limitations
+                st.info("Note: Phone numbers, emails, and opening hours are fetched using the Local Business Data API (via RapidAPI). The free plan has a limited quota (e.g., 500 requests/month) and may not support all features (e.g., email extraction). If the quota is exceeded, upgrade to a paid plan on RapidAPI. Otherwise, the app falls back to website scraping or assumes default hours (e.g., 9:00 AM - 5:00 PM for hospitals—please verify). Phone numbers are validated using the phonenumbers library. Reviews are fetched using the Google Places API if a GOOGLE_API_KEY is provided; otherwise, the reviews column is left empty.")
+
+                # Per-stage timings for this search
+                with st.expander("Stage Timings", expanded=False):
+                    timing_rows = [{"stage": stage, "calls": 1, "total_s": seconds, "avg_s": seconds}
+                                   for stage, seconds in stage_timings.items()]
+                    timing_rows += [{"stage": stage, "calls": len(values), "total_s": sum(values), "avg_s": sum(values) / len(values)}
+                                    for stage, values in enrich_timings.items()]
+                    st.dataframe(pd.DataFrame(timing_rows).round(3), use_container_width=True)
+                    page_stats = http_cache.pages.stats(since=pages_before)
+                    if page_stats["requests"]:
+                        st.write(f"Website cache: {page_stats['hits']} of {page_stats['requests']} pages unchanged "
+                                 f"({page_stats['hit_rate']:.0%}), {page_stats['bytes_saved'] / 1024:.0f} KB not downloaded")
+
+                # Display a static map
+                with st.expander("View Map", expanded=False):
+                    st.subheader(f"Map of {city.title()}")
+                    map_url = get_static_map(search_term, center)
+                    if map_url:
+                        st.image(map_url, caption=f"Location: {city.title()}", use_container_width=True)
+                    else:
+                        st.warning("Map image couldn't be loaded. Please check the logs for errors.")
+
+            except Exception as e:
+                st.error(f"An error occurred while fetching: {str(e)}. Try a different city or business type.")
+                logging.error(f"Fetching error: {str(e)}")
+
+# Download the last search's results; the file is serialized in memory, only in the chosen format
+if "last_results" in st.session_state:
+    last_df, last_name = st.session_state["last_results"]
+    col_format, col_download = st.columns([1, 2])
+    with col_format:
+        download_format = st.selectbox("Download format", exporters.available_formats(), format_func=str.upper)
+    with col_download:
+        st.download_button(f"Download {download_format.upper()}", exporters.to_bytes(last_df, download_format),
+                           file_name=f"{last_name}.{download_format}", mime=exporters.MIME_TYPES[download_format])
+
+# Batch search over many city x business type queries
+with st.expander("Batch Search", expanded=False):
+    st.write("Run many searches in one job. Progress is saved, so re-running the same list resumes where it stopped, and businesses found by several queries are only enriched once.")
+    batch_text = st.text_area("Queries (one per line)", placeholder="karachi hospitals\nlahore schools\nsukkur restaurants")
+    batch_file = st.file_uploader("...or upload a CSV with a 'query' column (or 'city' and 'business_type' columns)", type="csv")
+    batch_num = st.number_input("Businesses per query", min_value=1, max_value=50, value=5, key="batch_num")
+    if st.button("Run Batch"):
+        queries = batch.load_queries(batch_file) if batch_file else batch.load_queries(batch_text.splitlines())
+        if not queries:
+            st.error("Add at least one query of the form '<city> <business type>'.")
         else:
-            with st.spinner("Fetching data... Please wait."):
-                loading_placeholder = st.empty()
-                for i in range(3):
-                    loading_placeholder.markdown("🔄 Fetching" + "." * (i + 1))
-                    time.sleep(0.5)
-                loading_placeholder.empty()
-
-                try:
-                    logging.info(f"User searched for: '{search_term}' with {num_to_fetch} businesses")
-
-                    # Fetch business data using OpenStreetMap Overpass API
-                    businesses, center = fetch_osm_businesses(search_term, num_to_fetch)
-
-                    # Update last scrape time
-                    st.session_state.last_scrape_time = time.time()
-
-                    # Check if city was found and businesses were fetched
-                    if center is None:
-                        st.error("City not found in Pakistan. Please try a different city (e.g., 'karachi', 'lahore', 'islamabad').")
-                        st.stop()
-                    if not businesses:
-                        st.error("No businesses were fetched. Try a different business type (e.g., 'hospitals', 'restaurants') or city.")
-                        st.stop()
-
-                    # Add to search history
-                    add_search_to_history(search_term)
-
-                    # Display summary
-                    city = search_term.lower().split()[0]
-                    st.success(f"Found {len(businesses)} businesses for '{search_term}' in {city.title()}")
-
-                    # Save to CSV and Excel for download
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    csv_filename = f"business_data_{timestamp}"
-                    df = pd.DataFrame(businesses)
-                    df.to_csv(f"{csv_filename}.csv", index=False)
-                    df.to_excel(f"{csv_filename}.xlsx", index=False)
-
-                    # Display results in an expander
-                    with st.expander("Business Results", expanded=True):
-                        st.subheader("Fetched Businesses")
-                        st.dataframe(df, use_container_width=True)
-
-                        # Updated note about data enrichment and free plan limitations
-                        st.info("Note: Phone numbers, emails, and opening hours are fetched using the Local Business Data API (via RapidAPI). The free plan has a limited quota (e.g., 500 requests/month) and may not support all features (e.g., email extraction). If the quota is exceeded, upgrade to a paid plan on RapidAPI. Otherwise, the app falls back to website scraping or assumes default hours (e.g., 9:00 AM - 5:00 PM for hospitals—please verify). Phone numbers are validated using the phonenumbers library. Reviews are fetched using the Google Places API if a GOOGLE_API_KEY is provided; otherwise, 'N/A' is shown.")
-
-                        # Download buttons
-                        col_dl1, col_dl2 = st.columns(2)
-                        with col_dl1:
-                            csv_path = f"{csv_filename}.csv"
-                            with open(csv_path, "rb") as f:
-                                st.download_button("Download CSV", f, file_name=f"{csv_filename}.csv")
-                        with col_dl2:
-                            excel_path = f"{csv_filename}.xlsx"
-                            with open(excel_path, "rb") as f:
-                                st.download_button("Download Excel", f, file_name=f"{csv_filename}.xlsx")
-
-                    # Display a static map
-                    with st.expander("View Map", expanded=False):
-                        st.subheader(f"Map of {city.title()}")
-                        map_url = get_static_map(search_term, center)
-                        if map_url:
-                            st.image(map_url, caption=f"Location: {city.title()}", use_container_width=True)
-                        else:
-                            st.warning("Map image couldn't be loaded. Please check the logs for errors.")
-
-                    # Clean up old files
-                    cleanup_old_files()
-
-                except Exception as e:
-                    st.error(f"An error occurred while fetching: {str(e)}. Try a different city or business type.")
-                    logging.error(f"Fetching error: {str(e)}")
+            wait_seconds = start_scrape_cooldown()
+            if wait_seconds > 0:
+                st.error(f"Please wait {int(wait_seconds) + 1} seconds before fetching again.")
+            else:
+                state_path = batch.state_path_for(queries, batch_num)
+                output_path = state_path[:-len(".db")] + ".csv"
+                batch_run = batch.BatchRun(state_path, output_path)
+                batch_progress = st.progress(0.0, text=f"Running {len(queries)} queries...")
+
+                def report_batch_progress(done, total, query, rows):
+                    batch_progress.progress(done / total, text=f"[{done}/{total}] {query}: {rows} businesses")
+
+                logging.info(f"User started a batch of {len(queries)} queries")
+                batch_df = batch_run.run(queries, fetch_osm_businesses, batch_num, on_progress=report_batch_progress)
+                batch_progress.empty()
+                show_notices()
+                st.success(f"Batch finished: {len(batch_df)} rows, {batch_run.enriched.hits} enrichments reused.")
+                st.dataframe(batch_run.summary(), use_container_width=True)
+                st.dataframe(batch_df, use_container_width=True)
+                st.download_button("Download Batch CSV", batch_df.to_csv(index=False), file_name=os.path.basename(output_path), mime="text/csv")
 
 # About section with an icon
 st.markdown("---")
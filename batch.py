@@ -0,0 +1,234 @@
+"""Batch search: run many "city business_type" queries in one resumable job.
+
+Progress is checkpointed in a small SQLite state file. Every finished query
+is recorded, and every enriched business is stored by OSM id, so:
+  * a crashed or interrupted run picks up at the first unfinished query, and
+  * a business that shows up in several queries (overlapping cities or types)
+    is only enriched once.
+Rows are appended to one consolidated CSV as each query finishes. The
+process-wide response cache and rate limiter are shared with the web UI.
+
+    python batch.py queries.csv -o results.csv -n 10
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from records import BusinessRecord, RecordColumns, OSM_COLUMNS
+from storage import DATA_DIR
+
+
+def _csv_queries(f):
+    lines = []
+    for row in csv.DictReader(f):
+        row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+        query = row.get("query") or f"{row.get('city', '')} {row.get('business_type', '')}"
+        num = row.get("num_to_fetch")
+        lines.append((query, int(num) if num else None))
+    return lines
+
+
+def load_queries(source):
+    """reads queries from a CSV (a 'query' column, or 'city' + 'business_type'), a text file,
+    an uploaded CSV file object or a list
+
+    Returns a list of (query, num_to_fetch or None) tuples.
+    """
+    if isinstance(source, (list, tuple)):
+        lines = list(source)
+    elif hasattr(source, "read"):
+        content = source.read()
+        if isinstance(content, bytes):
+            content = content.decode("utf-8-sig")
+        lines = _csv_queries(io.StringIO(content))
+    elif str(source).lower().endswith(".csv"):
+        with open(source, newline="", encoding="utf-8-sig") as f:
+            lines = _csv_queries(f)
+    else:
+        with open(source, encoding="utf-8") as f:
+            lines = [line for line in f]
+
+    queries = []
+    seen = set()
+    for line in lines:
+        query, num = line if isinstance(line, tuple) else (line, None)
+        query = " ".join(str(query).lower().split())
+        if len(query.split()) < 2 or query in seen:
+            continue
+        seen.add(query)
+        queries.append((query, num))
+    return queries
+
+
+def state_path_for(queries, num_to_fetch=5):
+    """stable state file per query list and businesses-per-query count, so re-submitting the same
+    list resumes it, while asking for more businesses starts over"""
+    counts = [(query, num or num_to_fetch) for query, num in queries]
+    digest = hashlib.sha1(json.dumps(counts).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(DATA_DIR, f"batch_{digest}.db")
+
+
+class EnrichedStore:
+    """mapping of enrichment key -> BusinessRecord, persisted in the batch state file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            conn = sqlite3.connect(self.path, timeout=10)
+            row = conn.execute("SELECT row FROM enriched WHERE key = ?", (key,)).fetchone()
+            conn.close()
+            if row is None:
+                return default
+            self.hits += 1
+        return BusinessRecord.from_dict(json.loads(row[0]))
+
+    def __setitem__(self, key, business):
+        with self._lock:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("INSERT OR REPLACE INTO enriched (key, row) VALUES (?, ?)",
+                         (key, json.dumps(business.to_dict(), ensure_ascii=False)))
+            conn.commit()
+            conn.close()
+
+
+class BatchRun:
+    """one resumable batch job: its queries, their status and the consolidated output file"""
+
+    def __init__(self, state_path, output_path):
+        self.state_path = state_path
+        self.output_path = output_path
+        conn = sqlite3.connect(state_path)
+        conn.execute('''CREATE TABLE IF NOT EXISTS queries (
+            query TEXT PRIMARY KEY, status TEXT, rows INTEGER, seconds REAL, finished_at TEXT)''')
+        conn.execute("CREATE TABLE IF NOT EXISTS enriched (key TEXT PRIMARY KEY, row TEXT)")
+        conn.commit()
+        conn.close()
+        self.enriched = EnrichedStore(state_path)
+
+    def done(self):
+        conn = sqlite3.connect(self.state_path)
+        finished = {query for (query,) in conn.execute("SELECT query FROM queries WHERE status = 'done'")}
+        conn.close()
+        return finished
+
+    def _mark(self, query, status, rows, seconds):
+        conn = sqlite3.connect(self.state_path)
+        conn.execute("INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?, ?)",
+                      (query, status, rows, seconds, time.strftime("%Y-%m-%d %H:%M:%S")))
+        conn.commit()
+        conn.close()
+
+    def _append(self, query, businesses):
+        if not businesses:
+            return
+        df = RecordColumns(businesses, OSM_COLUMNS).to_dataframe()
+        df.insert(0, "query", query)
+        header = not os.path.exists(self.output_path)
+        df.to_csv(self.output_path, mode="a", header=header, index=False)
+
+    def _drop_unfinished_rows(self, finished):
+        # Rows are appended before their query is marked done; a crash in between leaves rows
+        # that the rerun would append a second time
+        if not os.path.exists(self.output_path):
+            return
+        df = pd.read_csv(self.output_path, dtype=str, keep_default_na=False)
+        if "query" not in df.columns:
+            return
+        stale = ~df["query"].isin(finished)
+        if stale.any():
+            logging.info(f"Dropping {int(stale.sum())} rows of unfinished queries from {self.output_path}")
+            df[~stale].to_csv(self.output_path, index=False)
+
+    def run(self, queries, fetch, num_to_fetch=5, on_progress=None):
+        """runs every unfinished query through fetch(query, num, enriched_cache=...)
+
+        on_progress(done, total, query, rows) is called after each query.
+        """
+        finished = self.done()
+        self._drop_unfinished_rows(finished)
+        total = len(queries)
+        for position, (query, num) in enumerate(queries, start=1):
+            if query in finished:
+                continue
+            started = time.perf_counter()
+            try:
+                businesses, center = fetch(query, num or num_to_fetch, enriched_cache=self.enriched)
+            except Exception as e:
+                logging.error(f"Batch query '{query}' failed: {e}")
+                self._mark(query, "failed", 0, time.perf_counter() - started)
+                if on_progress:
+                    on_progress(position, total, query, 0)
+                continue
+            self._append(query, businesses)
+            # Only "done" queries are skipped on resume; unknown cities are retried
+            status = "done" if center is not None else "city_not_found"
+            self._mark(query, status, len(businesses), time.perf_counter() - started)
+            logging.info(f"Batch query '{query}': {len(businesses)} businesses")
+            if on_progress:
+                on_progress(position, total, query, len(businesses))
+        return self.results()
+
+    def results(self):
+        """the consolidated output so far"""
+        if not os.path.exists(self.output_path):
+            return pd.DataFrame()
+        return pd.read_csv(self.output_path)
+
+    def summary(self):
+        conn = sqlite3.connect(self.state_path)
+        rows = conn.execute("SELECT query, status, rows, seconds, finished_at FROM queries").fetchall()
+        conn.close()
+        return pd.DataFrame(rows, columns=["query", "status", "rows", "seconds", "finished_at"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many city x business type searches in one resumable batch")
+    parser.add_argument("queries", help="CSV with a 'query' column (or 'city' and 'business_type'), or a text file with one query per line")
+    parser.add_argument("-o", "--output", default="batch_results.csv")
+    parser.add_argument("-n", "--num-to-fetch", type=int, default=5)
+    parser.add_argument("--state", help="state file used to resume (default: derived from the query list)")
+    parser.add_argument("--region", help="phone region for numbers without a country code (default: from each city)")
+    parser.add_argument("--restart", action="store_true", help="discard previous progress and output")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    queries = load_queries(args.queries)
+    state_path = args.state or state_path_for(queries, args.num_to_fetch)
+    if args.restart:
+        for path in (state_path, args.output):
+            if os.path.exists(path):
+                os.remove(path)
+
+    import http_cache
+    import phones
+    from scraper_core import fetch_osm_businesses
+
+    run = BatchRun(state_path, args.output)
+
+    def report(done, total, query, rows):
+        print(f"[{done}/{total}] {query}: {rows} businesses")
+
+    with phones.use_region(args.region):
+        run.run(queries, fetch_osm_businesses, args.num_to_fetch, on_progress=report)
+    print(f"Wrote {args.output} ({run.enriched.hits} enrichments reused, state in {state_path})")
+    page_stats = http_cache.pages.stats()
+    print(f"Website cache: {page_stats['hits']}/{page_stats['requests']} pages unchanged "
+          f"({page_stats['hit_rate']:.0%}), {page_stats['bytes_saved']} bytes saved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""Bounded contact crawler for business websites.
+
+Starting from the homepage, it follows the links most likely to hold contact
+details (contact, about, location, timings, ...) up to CRAWL_MAX_PAGES pages
+and CRAWL_MAX_DEPTH links deep, staying on the business's own host. tel: and
+mailto: anchors are taken as they are. The crawl stops as soon as every field
+the caller still needs (email, phone, opening hours) has been found.
+
+Politeness is per host: every request goes through the shared per-host rate
+limiter bucket, only one request is in flight per host at a time, and
+robots.txt (including Crawl-delay) is honoured through a cached parser.
+Pages already seen are revalidated with conditional GETs and only parsed
+again when their content changed (http_cache.PageCache). Different hosts
+are crawled concurrently:
+
+    python contact_crawler.py https://example.pk https://example2.pk
+"""
+
+import argparse
+import html as html_entities
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urljoin, urlparse, urldefrag
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+import contact_extract
+import http_cache
+import http_client
+import rate_limiter
+
+
+# Pages fetched per website, homepage included, and how many links away from it
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "4"))
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "1"))
+
+# Websites crawled in parallel by crawl_many
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "8"))
+
+# robots.txt files are kept this long, for at most this many hosts
+ROBOTS_TTL_SECONDS = 24 * 3600
+ROBOTS_CACHE_SIZE = 1024
+
+FIELDS = ("email", "phone", "hours")
+
+ANCHOR_RE = re.compile(r"<a\s[^>]*?href\s*=\s*[\"']?([^\"'\s>]+)[^>]*>(.*?)</a\s*>", re.IGNORECASE | re.DOTALL)
+# Link text or path words that suggest contact details, with their priority (higher first)
+LINK_KEYWORDS = (
+    (re.compile(r"contact|reach[-_ ]?us|get[-_ ]?in[-_ ]?touch", re.IGNORECASE), 3),
+    (re.compile(r"timing|hours|location|find[-_ ]?us|visit|directions", re.IGNORECASE), 2),
+    (re.compile(r"about", re.IGNORECASE), 1),
+)
+# Links that never hold contact details
+SKIP_LINK_RE = re.compile(r"\.(?:jpe?g|png|gif|svg|webp|pdf|zip|docx?|xlsx?|mp4|mp3)(?:$|\?)", re.IGNORECASE)
+
+
+def _host(url):
+    host = urlparse(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _link_score(href, text):
+    for pattern, score in LINK_KEYWORDS:
+        if pattern.search(href) or pattern.search(text):
+            return score
+    return 0
+
+
+def parse_anchors(html, base_url):
+    """returns (emails from mailto:, phones from tel:, [(score, url)] of same-host contact-like links)"""
+    emails, phones, links = [], [], []
+    host = _host(base_url)
+    for href, text in ANCHOR_RE.findall(html):
+        href = html_entities.unescape(href).strip()
+        scheme = href.split(":", 1)[0].lower()
+        if scheme == "mailto":
+            address = unquote(href[7:].split("?", 1)[0]).strip()
+            if contact_extract.EMAIL_RE.fullmatch(address):
+                emails.append(address)
+        elif scheme == "tel":
+            number = unquote(href[4:]).strip()
+            if sum(c.isdigit() for c in number) >= 7:
+                phones.append(number)
+        else:
+            url = urldefrag(urljoin(base_url, href))[0]
+            if not url.startswith(("http://", "https://")) or _host(url) != host or SKIP_LINK_RE.search(url):
+                continue
+            score = _link_score(urlparse(url).path, contact_extract.TAG_RE.sub(" ", text))
+            if score:
+                links.append((score, url))
+    return emails, phones, links
+
+
+def extract_page(html, base_url):
+    """{"email", "phone", "hours", "links"} of one page; links are [score, url] pairs worth following"""
+    emails, phones, links = parse_anchors(html, base_url)
+    email, phone, hours = contact_extract.extract_contacts(html)
+    # Explicit mailto:/tel: links are more reliable than matches in the text
+    return {"email": emails[0] if emails else email, "phone": phones[0] if phones else phone, "hours": hours,
+            "links": [[score, url] for score, url in links]}
+
+
+class RobotsCache:
+    """robots.txt parser per host, fetched once and kept for ROBOTS_TTL_SECONDS"""
+
+    def __init__(self, ttl=ROBOTS_TTL_SECONDS, size=ROBOTS_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._parsers = OrderedDict()
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def _fetch(self, root, session):
+        parser = RobotFileParser(root + "/robots.txt")
+        try:
+            rate_limiter.acquire_for_url(root)
+            response = session.get(root + "/robots.txt", timeout=5)
+        except requests.RequestException as e:
+            # Unreachable robots.txt: the page fetch itself will fail or succeed on its own
+            logging.info(f"Could not fetch robots.txt for {root}: {e}")
+            parser.allow_all = True
+            return parser
+        # Same rules as RobotFileParser.read(): 401/403 forbid everything, other errors allow everything
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif response.status_code >= 400:
+            parser.allow_all = True
+        else:
+            parser.parse(response.text[:contact_extract.MAX_DOWNLOAD_BYTES].splitlines())
+        parser.modified()
+        return parser
+
+    def get(self, url, session):
+        parts = urlparse(url)
+        root = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            entry = self._parsers.get(root)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._parsers.move_to_end(root)
+                return entry[0]
+        parser = self._fetch(root, session)
+        with self._lock:
+            self.fetches += 1
+            self._parsers[root] = (parser, time.monotonic())
+            self._parsers.move_to_end(root)
+            while len(self._parsers) > self.size:
+                self._parsers.popitem(last=False)
+        return parser
+
+
+class ContactCrawler:
+    """crawls business websites for contact details; one request in flight per host"""
+
+    def __init__(self, max_pages=CRAWL_MAX_PAGES, max_depth=CRAWL_MAX_DEPTH, user_agent=None, cache=http_cache.pages):
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.user_agent = user_agent or http_client.USER_AGENT
+        self.robots = RobotsCache()
+        # Per-page validators and extractions; None disables revalidation
+        self.cache = cache
+        self._host_locks = {}
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.blocked = 0
+        self.sites = 0
+
+    def _host_lock(self, url):
+        host = _host(url)
+        with self._lock:
+            lock = self._host_locks.get(host)
+            if lock is None:
+                lock = self._host_locks[host] = threading.Lock()
+            return lock
+
+    def allowed(self, url, session):
+        parser = self.robots.get(url, session)
+        delay = parser.crawl_delay(self.user_agent)
+        if delay:
+            # Slow the shared per-host bucket down to the site's own Crawl-delay
+            name = "website:" + urlparse(url).netloc.lower()
+            if rate_limiter.limiter.bucket(name).rate > 1 / float(delay):
+                rate_limiter.limiter.slow_down(name, 1 / float(delay), 1)
+        return parser.can_fetch(self.user_agent, url)
+
+    def fetch(self, url, session):
+        """contacts and links of one page (see extract_page); None if robots.txt forbids it
+
+        The page is revalidated against the page cache: a 304, or a download
+        whose content hash has not changed, reuses the stored extraction
+        without parsing anything.
+        """
+        if not self.allowed(url, session):
+            with self._lock:
+                self.blocked += 1
+            logging.info(f"robots.txt disallows {url}")
+            return None
+        entry = self.cache.get(url) if self.cache is not None else None
+        with self._host_lock(url):
+            rate_limiter.acquire_for_url(url)
+            # Streamed, so the connection only goes back to the pool once the response is closed (errors included)
+            with session.get(url, timeout=5, stream=True, headers=http_cache.PageCache.conditional_headers(entry)) as response:
+                with self._lock:
+                    self.pages += 1
+                if response.status_code == 304 and entry is not None:
+                    return self.cache.not_modified(url, entry)
+                response.raise_for_status()
+                html = contact_extract.read_capped(response)
+        if self.cache is None:
+            return extract_page(html, response.url or url)
+        content_hash = self.cache.content_hash(html)
+        if entry is not None and entry["content_hash"] == content_hash:
+            extracted = entry["extracted"]
+        else:
+            extracted = extract_page(html, response.url or url)
+        self.cache.store(url, response.headers, content_hash, len(html), extracted, entry)
+        return extracted
+
+    def crawl(self, start_url, session, need=FIELDS):
+        """returns {"email", "phone", "hours"} (None when not found) for one website
+
+        Fields outside `need` are still filled when they turn up, but the crawl
+        stops as soon as everything in `need` is known. Only a failure on the
+        first page is raised; later pages are skipped on error.
+        """
+        found = dict.fromkeys(FIELDS)
+        queue = [(0, 0, start_url)]  # (-score, depth, url), best candidates first
+        seen = {urldefrag(start_url)[0]}
+        fetched = 0
+        with self._lock:
+            self.sites += 1
+        while queue and fetched < self.max_pages:
+            _, depth, url = queue.pop(0)
+            try:
+                page = self.fetch(url, session)
+            except requests.RequestException as e:
+                if fetched == 0 and url == start_url:
+                    raise
+                logging.info(f"Skipping {url}: {e}")
+                continue
+            fetched += 1
+            if page is None:
+                continue
+
+            for field in FIELDS:
+                if found[field] is None and page[field]:
+                    found[field] = page[field]
+            if all(found[field] for field in need):
+                break
+
+            if depth < self.max_depth:
+                for score, link in page["links"]:
+                    if link not in seen:
+                        seen.add(link)
+                        queue.append((-score, depth + 1, link))
+                queue.sort(key=lambda item: item[:2])
+        logging.info(f"Crawled {fetched} page(s) of {start_url}: {found}")
+        return found
+
+    def stats(self):
+        return {"sites": self.sites, "pages": self.pages, "robots_blocked": self.blocked,
+                "robots_fetches": self.robots.fetches}
+
+
+crawler = ContactCrawler()
+
+
+def crawl(url, session, need=FIELDS):
+    """crawls one website with the shared crawler"""
+    return crawler.crawl(url, session, need)
+
+
+def crawl_many(urls, session, workers=CRAWL_WORKERS, need=FIELDS):
+    """crawls several websites concurrently; returns {url: found dict or the exception raised}"""
+    def run(url):
+        try:
+            return crawler.crawl(url, session, need)
+        except requests.RequestException as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(urls, executor.map(run, urls)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl business websites for email, phone and opening hours")
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--max-pages", type=int, default=CRAWL_MAX_PAGES)
+    parser.add_argument("--max-depth", type=int, default=CRAWL_MAX_DEPTH)
+    parser.add_argument("--workers", type=int, default=CRAWL_WORKERS)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    crawler.max_pages, crawler.max_depth = args.max_pages, args.max_depth
+    started = time.perf_counter()
+    for url, result in crawl_many(args.urls, http_client.build_session(), args.workers).items():
+        print(f"{url}: {result}")
+    print(f"{crawler.stats()} in {time.perf_counter() - started:.1f} s")
+    print(f"page cache: {http_cache.pages.stats()}")
+
+
+if __name__ == "__main__":
+    main()
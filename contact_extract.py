@@ -0,0 +1,178 @@
+"""Contact detail extraction (email, phone, opening hours) from business websites.
+
+The page is read up to a byte cap and converted to text with the fastest
+parser available: selectolax, then lxml, then a stdlib tag stripper (plenty
+for finding contact details, and much cheaper than building a soup). Script
+and style contents are dropped first. The page is then converted and
+scanned in chunks, stopping as soon as an email, a phone and opening hours
+have all been found. The patterns are compiled once at import.
+
+    python contact_extract.py --benchmark fixtures/html
+"""
+
+import argparse
+import glob
+import html as html_entities
+import os
+import re
+import time
+
+
+# Never download or parse more than this much of a page
+MAX_DOWNLOAD_BYTES = int(os.getenv("CONTACT_MAX_BYTES", str(512 * 1024)))
+
+# HTML is converted and scanned in slices of about this size, so a hit near the top ends the work early
+CHUNK_CHARS = 32 * 1024
+
+EMAIL_RE = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}(?:\.[a-zA-Z]{2,})?")
+PHONE_RE = re.compile(r"(\+\d{1,3}\s?\d{1,4}\s?\d{6,10}|\d{3}-\d{3}-\d{4}|\d{10,12}|0\d{2,3}-\d{7,8})")
+# The lookahead lets the regex engine skip positions that cannot start a match
+HOURS_RE = re.compile(r"(?=[MTWFSOmtwfso])(?:(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun|Mo-Fr|Mo-Su)\s*(?:-)?\s*(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun)?\s*\d{1,2}:\d{2}\s*-\s*\d{1,2}:\d{2})"
+                      r"|(?:Open\s*\d{1,2}\s*(?:AM|PM)\s*to\s*\d{1,2}\s*(?:AM|PM))", re.IGNORECASE)
+# Mailboxes preferred over the first address on the page
+PREFERRED_EMAIL_RE = re.compile(r"contact|info|support", re.IGNORECASE)
+SCRIPT_STYLE_RE = re.compile(r"<(script|style|noscript)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(r"<!--.*?-->|<[^>]*>", re.DOTALL)
+
+
+def _selectolax_text(html):
+    from selectolax.parser import HTMLParser
+    return HTMLParser(html).text(separator=" ")
+
+
+def _lxml_text(html):
+    import lxml.etree
+    import lxml.html
+    try:
+        doc = lxml.html.document_fromstring(html)
+    except lxml.etree.ParserError:
+        # "Document is empty": a chunk holding only closing tags or a script-only page
+        return _regex_text(html)
+    # Separate neighbouring text nodes like selectolax does, so an email is not glued to the next word
+    return " ".join(doc.itertext())
+
+
+def _regex_text(html):
+    return html_entities.unescape(TAG_RE.sub(" ", html))
+
+
+def _pick_parser():
+    for name, module, parse in (("selectolax", "selectolax", _selectolax_text), ("lxml", "lxml", _lxml_text)):
+        try:
+            __import__(module)
+            return name, parse
+        except ImportError:
+            continue
+    return "regex", _regex_text
+
+
+PARSER_NAME, html_to_text = _pick_parser()
+
+
+def read_capped(response, max_bytes=MAX_DOWNLOAD_BYTES):
+    """reads a streamed requests response up to max_bytes and decodes it; "" for non-HTML content"""
+    content_type = response.headers.get("Content-Type", "text/html").lower()
+    if "html" not in content_type and "text" not in content_type:
+        return ""
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=16384):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            break
+    response.close()
+    return b"".join(chunks)[:max_bytes].decode(response.encoding or "utf-8", errors="replace")
+
+
+def _chunks(html, size=CHUNK_CHARS):
+    # Cut just before a tag so no text node is split between two chunks
+    start = 0
+    while start < len(html):
+        end = len(html) if start + size >= len(html) else html.find("<", start + size)
+        if end == -1:
+            end = len(html)
+        yield html[start:end]
+        start = end
+
+
+def extract_contacts(html, max_chars=MAX_DOWNLOAD_BYTES):
+    """returns (email, raw phone, opening hours) found in a page, None for each one that is missing"""
+    email = phone = hours = None
+    # Scripts are dropped up front: a chunk boundary inside a large inline script would keep it as text
+    html = SCRIPT_STYLE_RE.sub(" ", html[:max_chars])
+    for chunk in _chunks(html):
+        text = html_to_text(chunk)
+        if email is None:
+            # A contact/info/support mailbox wins over the first address in the same chunk
+            for match in EMAIL_RE.finditer(text):
+                if email is None:
+                    email = match.group(0)
+                if PREFERRED_EMAIL_RE.search(match.group(0)):
+                    email = match.group(0)
+                    break
+        if phone is None:
+            match = PHONE_RE.search(text)
+            phone = match.group(0) if match else None
+        if hours is None:
+            match = HOURS_RE.search(text)
+            hours = match.group(0) if match else None
+        if email and phone and hours:
+            break
+    return email, phone, hours
+
+
+def _legacy_extract(html):
+    # What scrape_website did before this module: full soup, get_text, findall
+    from bs4 import BeautifulSoup
+    text = BeautifulSoup(html, "html.parser").get_text()
+    emails = re.findall(EMAIL_RE.pattern, text)
+    email = next((e for e in emails if PREFERRED_EMAIL_RE.search(e)), emails[0] if emails else None)
+    phones = re.findall(PHONE_RE.pattern, text)
+    hours = re.search(HOURS_RE.pattern, text, re.IGNORECASE)
+    return email, phones[0] if phones else None, hours.group(0) if hours else None
+
+
+def benchmark(paths, repeat=20):
+    """times the legacy extraction against extract_contacts over saved HTML pages"""
+    pages = []
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages.append((os.path.basename(path), f.read()))
+    print(f"{len(pages)} pages, parser: {PARSER_NAME}, {repeat} runs each")
+    totals = {"legacy": 0.0, "engine": 0.0}
+    for name, html in pages:
+        row = []
+        for label, extract in (("legacy", _legacy_extract), ("engine", extract_contacts)):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                result = extract(html)
+            seconds = (time.perf_counter() - started) / repeat
+            totals[label] += seconds
+            row.append(f"{label} {seconds * 1000:7.2f} ms {result}")
+        print(f"  {name} ({len(html) / 1024:.0f} KB)")
+        for line in row:
+            print(f"    {line}")
+    print(f"  total: legacy {totals['legacy'] * 1000:.1f} ms, engine {totals['engine'] * 1000:.1f} ms per pass")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract contact details from saved HTML pages")
+    parser.add_argument("paths", nargs="+", help="HTML files or directories of .html files")
+    parser.add_argument("--benchmark", action="store_true", help="compare against the previous extraction")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.html"))) if os.path.isdir(path) else [path])
+    if args.benchmark:
+        benchmark(files, args.repeat)
+        return
+    for path in files:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            print(f"{path}: {extract_contacts(f.read())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,531 @@
+"""Entity resolution: link business records from every source to one canonical business.
+
+OSM elements, RapidAPI businesses, Google places and Google Maps listings all
+describe the same hospitals and restaurants. Records are linked by:
+  * strong keys: a source id ("osm:node/123", "rapidapi:<business_id>",
+    "google:<place_id>", "maps:<place url>"), the E.164 phone number and the
+    website host (shared phones/websites only link records with similar
+    names, or ones at the same site, so branches of a chain and unrelated
+    businesses behind one UAN number stay apart);
+  * proximity: normalized name tokens inside a grid cell of GRID_DEGREES,
+    checked against the 8 neighbouring cells and confirmed by name
+    similarity and distance.
+Records of different kinds (OSM amenity, e.g. "school" and "hospital") are
+never linked by phone, website or proximity: type words are left out of
+name comparison, so "City School" and "City Hospital" would look alike.
+Candidates are only ever compared inside these blocks and linked with a
+union-find, so resolving a batch stays close to linear in its size.
+
+EntityIndex persists the result in SQLite (entities.db) with stable ids:
+an entity keeps its id as it gains records, and when two entities turn out
+to be the same one the older id survives and the other redirects to it.
+Enrichment is skipped for elements that resolve to an entity that was
+enriched recently (see resolved()).
+
+    python entities.py results.csv -o deduplicated.csv
+    python entities.py --benchmark 100000
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from urllib.parse import urlparse
+
+import phones
+from records import BusinessRecord, FIELDS
+from storage import DATA_DIR, lazy_singletons
+
+
+ENTITY_PATH = os.path.join(DATA_DIR, 'entities.db')
+
+# Set ENTITY_RESOLUTION=0 to enrich every element again
+ENTITY_RESOLUTION = os.getenv("ENTITY_RESOLUTION", "1") != "0"
+
+# An enriched entity is reused instead of enriching again for this long
+ENTITY_MAX_AGE = 7 * 24 * 60 * 60
+
+# Grid cell edge in degrees (~550 m); neighbours are always checked too
+GRID_DEGREES = 0.005
+
+# Same name tokens within this distance are the same place
+MAX_DISTANCE_M = 250
+# A shared phone or website links similarly named records up to this far apart (or without coordinates),
+# and records at the same site whatever their names
+MAX_SHARED_KEY_DISTANCE_M = 2000
+SAME_SITE_DISTANCE_M = 50
+# Token overlap (Jaccard) needed to call two names the same
+NAME_SIMILARITY = 0.6
+
+# Blocks bigger than this are not compared exhaustively (e.g. a food court full of "cafe"s)
+MAX_BLOCK_SIZE = 50
+
+# Words that say what a business is, not which one it is
+GENERIC_TOKENS = {
+    "the", "and", "of", "pvt", "ltd", "private", "limited", "co", "company", "&",
+    "hospital", "hospitals", "clinic", "medical", "center", "centre", "restaurant", "restaurants",
+    "cafe", "school", "schools", "college", "public", "high", "primary", "branch", "campus",
+}
+
+# Hosts shared by unrelated businesses, never used as a website key
+SHARED_HOSTS = {
+    "facebook.com", "m.facebook.com", "instagram.com", "twitter.com", "x.com", "linktr.ee",
+    "sites.google.com", "business.site", "wa.me", "youtube.com", "tiktok.com",
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def name_tokens(name):
+    """set of lowercase ascii word tokens of a business name"""
+    if not name:
+        return frozenset()
+    name = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii").lower()
+    return frozenset(TOKEN_RE.findall(name))
+
+
+def distinctive(tokens):
+    """name tokens used for blocking; all of them when the name is only generic words"""
+    return (tokens - GENERIC_TOKENS) or tokens
+
+
+def name_similarity(a, b):
+    a, b = distinctive(a), distinctive(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def grid_cell(lat, lon):
+    if lat is None or lon is None:
+        return None
+    return math.floor(lat / GRID_DEGREES), math.floor(lon / GRID_DEGREES)
+
+
+def neighbour_cells(cell):
+    row, col = cell
+    return [(row + d_row, col + d_col) for d_row in (-1, 0, 1) for d_col in (-1, 0, 1)]
+
+
+def distance_m(a, b):
+    """equirectangular distance between (lat, lon) pairs; plenty at city scale"""
+    lat = math.radians((a[0] + b[0]) / 2)
+    d_lat = math.radians(b[0] - a[0])
+    d_lon = math.radians(b[1] - a[1]) * math.cos(lat)
+    return 6371000 * math.hypot(d_lat, d_lon)
+
+
+def website_key(url):
+    if not url:
+        return None
+    host = urlparse(url if "//" in url else "//" + url).netloc.lower().split(":")[0]
+    host = host[4:] if host.startswith("www.") else host
+    if not host or host in SHARED_HOSTS:
+        return None
+    return "web:" + host
+
+
+def source_key(source, source_id):
+    return f"{source}:{source_id}"
+
+
+class Entry:
+    """what the resolver needs from one record"""
+
+    __slots__ = ("record", "kind", "tokens", "point", "source_keys", "shared_keys")
+
+    def __init__(self, record, source_keys=(), phone_e164=None, kind=None):
+        self.record = record
+        # What the business is (an OSM amenity such as "hospital"), None when the source does not say
+        self.kind = kind.lower() if kind else None
+        self.tokens = name_tokens(record.name)
+        self.point = (record.latitude, record.longitude) if record.latitude is not None and record.longitude is not None else None
+        self.source_keys = [source_key(*key) if isinstance(key, tuple) else key for key in source_keys]
+        if phone_e164 is None and record.phone:
+            number = phones.normalize(record.phone)
+            phone_e164 = number.e164 if number else None
+        self.shared_keys = [key for key in ("phone:" + phone_e164 if phone_e164 else None, website_key(record.website)) if key]
+
+    def cell(self):
+        return grid_cell(*self.point) if self.point else None
+
+
+def same_kind(a, b):
+    """records of different known kinds are never the same business"""
+    return a.kind is None or b.kind is None or a.kind == b.kind
+
+
+def same_place(a, b):
+    """proximity match: close together with mostly the same name"""
+    if a.point is None or b.point is None or not same_kind(a, b):
+        return False
+    return distance_m(a.point, b.point) <= MAX_DISTANCE_M and name_similarity(a.tokens, b.tokens) >= NAME_SIMILARITY
+
+
+def may_share_key(a, b):
+    """a shared phone or website only links records that could be the same branch"""
+    if not same_kind(a, b):
+        return False
+    distance = distance_m(a.point, b.point) if a.point is not None and b.point is not None else None
+    if distance is not None and distance <= SAME_SITE_DISTANCE_M:
+        return True
+    # Chains and hospital groups share one number across differently named businesses
+    return (distance is None or distance <= MAX_SHARED_KEY_DISTANCE_M) and name_similarity(a.tokens, b.tokens) >= NAME_SIMILARITY
+
+
+class Resolver:
+    """incremental in-memory resolution with blocking and union-find
+
+    add() returns the index of the entry; group() the index of the first entry
+    of its entity. Each add only looks at the postings of its own keys and the
+    blocks of its 9 grid cells, so n records cost O(n) lookups.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self._parent = []
+        self._keys = {}      # strong key -> first entry index
+        self._blocks = {}    # (cell, token) -> entry indexes
+        self.comparisons = 0
+
+    def _find(self, i):
+        while self._parent[i] != i:
+            self._parent[i] = self._parent[self._parent[i]]
+            i = self._parent[i]
+        return i
+
+    def _union(self, a, b):
+        a, b = self._find(a), self._find(b)
+        if a != b:
+            # The older entry stays the root, so group() ids do not change as records arrive
+            self._parent[max(a, b)] = min(a, b)
+
+    def add(self, entry):
+        index = len(self.entries)
+        self.entries.append(entry)
+        self._parent.append(index)
+
+        for key in entry.source_keys:
+            if key in self._keys:
+                self._union(index, self._keys[key])
+            else:
+                self._keys[key] = index
+        for key in entry.shared_keys:
+            other = self._keys.get(key)
+            if other is None:
+                self._keys[key] = index
+            elif may_share_key(entry, self.entries[other]):
+                self._union(index, other)
+
+        cell = entry.cell()
+        if cell is not None:
+            tokens = distinctive(entry.tokens)
+            for neighbour in neighbour_cells(cell):
+                for token in tokens:
+                    for other in self._blocks.get((neighbour, token), ())[:MAX_BLOCK_SIZE]:
+                        if self._find(other) != self._find(index):
+                            self.comparisons += 1
+                            if same_place(entry, self.entries[other]):
+                                self._union(index, other)
+            for token in tokens:
+                self._blocks.setdefault((cell, token), []).append(index)
+        return index
+
+    def group(self, index):
+        return self._find(index)
+
+    def groups(self):
+        """{root index: [entry indexes]} in order of first appearance"""
+        groups = {}
+        for index in range(len(self.entries)):
+            groups.setdefault(self._find(index), []).append(index)
+        return groups
+
+
+def merge_records(records):
+    """one record from several: each field takes the first value that is not None"""
+    merged = {}
+    for record in records:
+        for field in FIELDS:
+            if merged.get(field) is None:
+                merged[field] = getattr(record, field)
+    return BusinessRecord(**merged)
+
+
+def _phone_keys(records, region=None):
+    # Whole phone column at once: pre-filtered and parsed once per distinct number
+    frame = phones.normalize_many([record.phone for record in records], region)
+    return [value or "" for value in frame["e164"]]
+
+
+def resolve(records, source_keys=None, region=None):
+    """deduplicates a batch; returns (canonical records, group number of each input record)"""
+    source_keys = source_keys or [()] * len(records)
+    resolver = Resolver()
+    for record, keys, phone in zip(records, source_keys, _phone_keys(records, region)):
+        resolver.add(Entry(record, keys, phone))
+    groups = resolver.groups()
+    numbers = {root: number for number, root in enumerate(groups)}
+    canonical = [merge_records([records[i] for i in members]) for members in groups.values()]
+    return canonical, [numbers[resolver.group(i)] for i in range(len(records))]
+
+
+def stable_id(entry):
+    """id derived from the entry's first strong key (or its name and cell), so rebuilding gives the same ids"""
+    basis = (entry.source_keys + entry.shared_keys)[:1] or [f"{sorted(entry.tokens)}|{entry.cell()}"]
+    return "biz_" + hashlib.sha1(basis[0].encode("utf-8")).hexdigest()[:12]
+
+
+class EntityIndex:
+    """persistent entities with stable ids, their keys and their grid blocks"""
+
+    def __init__(self, path=ENTITY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.merges = 0
+        conn = self._connect()
+        conn.execute('''CREATE TABLE IF NOT EXISTS entities (
+            id TEXT PRIMARY KEY, record TEXT, enriched_at REAL, created_at REAL, updated_at REAL, kind TEXT)''')
+        if "kind" not in {row[1] for row in conn.execute("PRAGMA table_info(entities)")}:
+            # Index files written before entities had a kind
+            conn.execute("ALTER TABLE entities ADD COLUMN kind TEXT")
+        conn.execute("CREATE TABLE IF NOT EXISTS entity_keys (key TEXT PRIMARY KEY, entity_id TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS entity_blocks (block TEXT, entity_id TEXT, PRIMARY KEY (block, entity_id))")
+        conn.execute("CREATE TABLE IF NOT EXISTS merged (old_id TEXT PRIMARY KEY, entity_id TEXT)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entity_keys_entity ON entity_keys (entity_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entity_blocks_entity ON entity_blocks (entity_id)")
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @staticmethod
+    def _blocks(entry, cells=None):
+        cell = entry.cell()
+        if cell is None:
+            return []
+        return [f"{row}:{col}:{token}" for row, col in (cells or [cell]) for token in distinctive(entry.tokens)]
+
+    @staticmethod
+    def _load(conn, entity_id):
+        # (record, enriched_at, created_at, kind) or None
+        row = conn.execute("SELECT record, enriched_at, created_at, kind FROM entities WHERE id = ?", (entity_id,)).fetchone()
+        if row is None:
+            return None
+        return BusinessRecord.from_dict(json.loads(row[0])), row[1], row[2], row[3]
+
+    @staticmethod
+    def _redirect(conn, entity_id):
+        row = conn.execute("SELECT entity_id FROM merged WHERE old_id = ?", (entity_id,)).fetchone()
+        return row[0] if row else entity_id
+
+    def _candidates(self, conn, entry):
+        # {entity id: stored row} of the entities this entry belongs to, oldest first
+        found = {}
+        for key in entry.source_keys + entry.shared_keys:
+            row = conn.execute("SELECT entity_id FROM entity_keys WHERE key = ?", (key,)).fetchone()
+            if row and row[0] not in found:
+                stored = self._load(conn, row[0])
+                if stored and (key in entry.source_keys or may_share_key(entry, Entry(stored[0], phone_e164="", kind=stored[3]))):
+                    found[row[0]] = stored
+        blocks = self._blocks(entry, neighbour_cells(entry.cell()) if entry.cell() else None)
+        for start in range(0, len(blocks), 400):
+            chunk = blocks[start:start + 400]
+            query = f"SELECT DISTINCT entity_id FROM entity_blocks WHERE block IN ({','.join('?' * len(chunk))})"
+            for (entity_id,) in conn.execute(query, chunk).fetchmany(MAX_BLOCK_SIZE):
+                if entity_id not in found:
+                    stored = self._load(conn, entity_id)
+                    if stored and same_place(entry, Entry(stored[0], phone_e164="", kind=stored[3])):
+                        found[entity_id] = stored
+        return dict(sorted(found.items(), key=lambda item: (item[1][2], item[0])))
+
+    def lookup(self, entry):
+        """(entity id, canonical record, enriched_at) of the entity an entry resolves to, or None"""
+        conn = self._connect()
+        try:
+            for entity_id, (record, enriched_at, _, _) in self._candidates(conn, entry).items():
+                return entity_id, record, enriched_at
+            return None
+        finally:
+            conn.close()
+
+    def resolved(self, record, source_keys=(), max_age=ENTITY_MAX_AGE, kind=None):
+        """(entity id, canonical record) if this business was already enriched within max_age, else None"""
+        try:
+            found = self.lookup(Entry(record, source_keys, kind=kind))
+        except sqlite3.Error as e:
+            logging.error(f"Entity index read failed for {record.name}: {e}")
+            return None
+        if found is None or found[2] is None or time.time() - found[2] > max_age:
+            return None
+        with self._lock:
+            self.hits += 1
+        return found[0], found[1]
+
+    def _add(self, conn, entry, enriched):
+        now = time.time()
+        candidates = self._candidates(conn, entry)
+        if not candidates:
+            # Ids are hashes of the first key, so a rebuilt index hands out the same ones
+            entity_id = self._redirect(conn, stable_id(entry))
+            stored = self._load(conn, entity_id)
+            candidates = {entity_id: stored} if stored else {}
+        kind = entry.kind
+        if not candidates:
+            record, enriched_at, created_at = entry.record, None, now
+        else:
+            entity_id, (record, enriched_at, created_at, stored_kind) = next(iter(candidates.items()))
+            kind = kind or stored_kind
+            # Fresh enrichment results win; otherwise the new record only fills gaps
+            records = [entry.record, record] if enriched else [record, entry.record]
+            for other_id, (other, other_enriched_at, _, _) in list(candidates.items())[1:]:
+                records.append(other)
+                enriched_at = max(filter(None, (enriched_at, other_enriched_at)), default=None)
+                conn.execute("UPDATE entity_keys SET entity_id = ? WHERE entity_id = ?", (entity_id, other_id))
+                conn.execute("UPDATE OR IGNORE entity_blocks SET entity_id = ? WHERE entity_id = ?", (entity_id, other_id))
+                conn.execute("DELETE FROM entity_blocks WHERE entity_id = ?", (other_id,))
+                conn.execute("UPDATE merged SET entity_id = ? WHERE entity_id = ?", (entity_id, other_id))
+                conn.execute("INSERT OR REPLACE INTO merged VALUES (?, ?)", (other_id, entity_id))
+                conn.execute("DELETE FROM entities WHERE id = ?", (other_id,))
+                self.merges += 1
+            record = merge_records(records)
+        conn.execute("INSERT OR REPLACE INTO entities (id, record, enriched_at, created_at, updated_at, kind) VALUES (?, ?, ?, ?, ?, ?)",
+                     (entity_id, json.dumps(record.to_dict(), ensure_ascii=False), now if enriched else enriched_at,
+                      created_at, now, kind))
+        conn.executemany("INSERT OR REPLACE INTO entity_keys VALUES (?, ?)", [(key, entity_id) for key in entry.source_keys])
+        # A phone or website shared by far-apart branches stays with the first entity that had it
+        conn.executemany("INSERT OR IGNORE INTO entity_keys VALUES (?, ?)", [(key, entity_id) for key in entry.shared_keys])
+        conn.executemany("INSERT OR IGNORE INTO entity_blocks VALUES (?, ?)",
+                         [(block, entity_id) for block in self._blocks(entry)])
+        return entity_id
+
+    def add(self, record, source_keys=(), enriched=False, kind=None):
+        """links a record into the index; returns its stable entity id"""
+        return self.add_many([record], [source_keys], enriched, kind)[0]
+
+    def add_many(self, records, source_keys=None, enriched=False, kind=None):
+        """links a batch of one kind in one transaction; the batch is first resolved in memory, so each
+        entity it contains is written once"""
+        source_keys = source_keys or [()] * len(records)
+        resolver = Resolver()
+        entries = [Entry(record, keys, phone, kind) for record, keys, phone in zip(records, source_keys, _phone_keys(records))]
+        for entry in entries:
+            resolver.add(entry)
+        ids = {}
+        with self._lock:
+            conn = self._connect()
+            try:
+                for root, members in resolver.groups().items():
+                    merged = Entry(merge_records([entries[i].record for i in members]), phone_e164="", kind=kind)
+                    merged.source_keys = list(dict.fromkeys(key for i in members for key in entries[i].source_keys))
+                    merged.shared_keys = list(dict.fromkeys(key for i in members for key in entries[i].shared_keys))
+                    ids[root] = self._add(conn, merged, enriched)
+                conn.commit()
+            finally:
+                conn.close()
+        return [ids[resolver.group(i)] for i in range(len(records))]
+
+    def canonical_id(self, entity_id):
+        """follows merges to the id an entity is known by now"""
+        conn = self._connect()
+        try:
+            return self._redirect(conn, entity_id)
+        finally:
+            conn.close()
+
+    def get(self, entity_id):
+        conn = self._connect()
+        try:
+            found = self._load(conn, self._redirect(conn, entity_id))
+            return found[0] if found else None
+        finally:
+            conn.close()
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            entities, keys = conn.execute(
+                "SELECT (SELECT COUNT(*) FROM entities), (SELECT COUNT(*) FROM entity_keys)").fetchone()
+        finally:
+            conn.close()
+        return {"entities": entities, "keys": keys, "enrichments_skipped": self.hits, "merges": self.merges}
+
+
+# entities.index: the shared index, opened on first use
+__getattr__ = lazy_singletons(globals(), {"index": EntityIndex})
+
+
+def _synthetic_records(n, seed=11):
+    # n records describing about n/3 places, each seen by up to three sources with noisy names
+    rng = random.Random(seed)
+    words = ["city", "care", "national", "lady", "reading", "civil", "al", "noor", "shifa", "united", "liaquat",
+             "memorial", "family", "star", "green", "crescent", "model", "grammar", "karachi", "grill"]
+    kinds = ["hospital", "restaurant", "school", "clinic"]
+    records, keys = [], []
+    place = 0
+    while len(records) < n:
+        place += 1
+        name = " ".join(rng.sample(words, 2) + [f"{place}", rng.choice(kinds)])
+        lat, lon = 24.8 + rng.random() * 0.4, 66.9 + rng.random() * 0.4
+        phone = f"+92 21 {rng.randrange(10 ** 7):07d}"
+        for source in rng.sample(["osm", "rapidapi", "maps"], rng.randint(1, 3)):
+            records.append(BusinessRecord(
+                name=name.upper() if source == "maps" else name,
+                latitude=lat + rng.uniform(-0.0005, 0.0005), longitude=lon + rng.uniform(-0.0005, 0.0005),
+                phone=phone if rng.random() < 0.6 else None,
+                website=f"https://www.place{place}.pk" if rng.random() < 0.3 else None))
+            keys.append([(source, f"{place}-{source}")])
+    return records[:n], keys[:n]
+
+
+def benchmark(sizes):
+    """resolve() time per record for growing batches; flat means near-linear"""
+    for n in sizes:
+        records, keys = _synthetic_records(n)
+        started = time.perf_counter()
+        canonical, _ = resolve(records, keys)
+        seconds = time.perf_counter() - started
+        print(f"  {n:>8} records -> {len(canonical):>7} entities  {seconds:6.2f} s  ({seconds / n * 1e6:5.1f} us/record)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicate business records across sources")
+    parser.add_argument("source", nargs="?", help=".csv, .jsonl or .parquet export to deduplicate")
+    parser.add_argument("-o", "--output", help="where to write the canonical businesses (default: print a summary)")
+    parser.add_argument("--region", help="phone region for numbers without a country code")
+    parser.add_argument("--benchmark", type=int, nargs="*", metavar="ROWS")
+    args = parser.parse_args()
+
+    if args.benchmark is not None:
+        benchmark(args.benchmark or [10000, 100000])
+        return
+    if not args.source:
+        parser.error("source is required")
+    import exporters
+    rows = exporters.read_rows(args.source).to_dict("records")
+    records = [BusinessRecord.from_dict(row) for row in rows]
+    canonical, groups = resolve(records, region=args.region)
+    print(f"{len(records)} records -> {len(canonical)} businesses")
+    if args.output:
+        import pandas as pd
+        columns = [column for column in FIELDS if any(getattr(record, column) is not None for record in canonical)]
+        frame = pd.DataFrame([record.to_dict(columns) for record in canonical])
+        with open(args.output, "wb") as f:
+            f.write(exporters.to_bytes(frame, os.path.splitext(args.output)[1].lstrip(".")))
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
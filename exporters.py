@@ -0,0 +1,167 @@
+"""Append-friendly export formats for business rows.
+
+JSONL and CSV files are appended to row by row, so a long or resumed run
+never rewrites what is already on disk. Parquet is streamed through a writer
+kept open for the run, one row group per append. Excel cannot be appended
+without rewriting the whole workbook, so it is only produced on demand from
+one of the other formats (to_xlsx) or in memory for a download (to_bytes).
+
+    python exporters.py results.jsonl results.xlsx
+
+Parquet needs the optional pyarrow package, Excel needs openpyxl.
+"""
+
+import argparse
+import csv
+import importlib.util
+import io
+import json
+import os
+
+
+MIME_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def available_formats():
+    """formats whose optional dependencies are installed"""
+    formats = ["csv", "jsonl"]
+    if importlib.util.find_spec("pyarrow"):
+        formats.append("parquet")
+    if importlib.util.find_spec("openpyxl"):
+        formats.append("xlsx")
+    return formats
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+    return pa, pq
+
+
+def append_jsonl(rows, path):
+    """appends one JSON object per row"""
+    with open(path, "a", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+
+
+def append_csv(rows, path, columns=None):
+    """appends rows, writing the header only when the file is new"""
+    rows = list(rows)
+    if not rows and not columns:
+        return
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns or list(rows[0]), extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+class ParquetAppender:
+    """Parquet file kept open for a run; every append() becomes one row group
+
+    The schema is taken from the first batch (all-null columns become strings)
+    unless one is given. Opening a file that already exists carries its rows
+    over once, so a resumed run keeps them.
+    """
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.schema = schema
+        self.rows = 0
+        self._writer = None
+
+    def _open(self, table):
+        pa, pq = _pyarrow()
+        if self.schema is None:
+            self.schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                                     for f in table.schema])
+        existing = pq.read_table(self.path) if os.path.exists(self.path) else None
+        self._writer = pq.ParquetWriter(self.path, self.schema)
+        if existing is not None and existing.num_rows:
+            self._writer.write_table(existing.cast(self.schema))
+            self.rows += existing.num_rows
+
+    def append(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        pa, _ = _pyarrow()
+        if self._writer is None:
+            self._open(pa.Table.from_pylist(rows))
+        self._writer.write_table(pa.Table.from_pylist(rows, schema=self.schema))
+        self.rows += len(rows)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Read back as text so "+92..." does not turn into a number
+PHONE_COLUMNS = ("phone", "phone_number")
+
+
+def read_rows(path):
+    """loads a .csv, .jsonl or .parquet export into a DataFrame"""
+    import pandas as pd
+    if path.endswith(".jsonl"):
+        return pd.read_json(path, lines=True, dtype=False)
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, dtype={column: str for column in PHONE_COLUMNS})
+
+
+def to_xlsx(path, xlsx_path=None):
+    """converts an export to Excel on demand; returns the .xlsx path"""
+    xlsx_path = xlsx_path or os.path.splitext(path)[0] + ".xlsx"
+    read_rows(path).to_excel(xlsx_path, index=False)
+    return xlsx_path
+
+
+def to_bytes(df, fmt):
+    """serializes a DataFrame in memory, e.g. for st.download_button"""
+    if fmt == "csv":
+        return df.to_csv(index=False).encode("utf-8")
+    if fmt == "jsonl":
+        return df.to_json(orient="records", lines=True, force_ascii=False).encode("utf-8")
+    buffer = io.BytesIO()
+    if fmt == "parquet":
+        _pyarrow()
+        df.to_parquet(buffer, index=False)
+    elif fmt == "xlsx":
+        df.to_excel(buffer, index=False)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a .csv, .jsonl or .parquet export to another format")
+    parser.add_argument("source")
+    parser.add_argument("target", help="output path; its extension (.csv, .jsonl, .parquet, .xlsx) picks the format")
+    args = parser.parse_args()
+
+    fmt = os.path.splitext(args.target)[1].lstrip(".")
+    with open(args.target, "wb") as f:
+        f.write(to_bytes(read_rows(args.source), fmt))
+    print(f"Wrote {args.target}")
+
+
+if __name__ == "__main__":
+    main()
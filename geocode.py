@@ -0,0 +1,223 @@
+"""Persistent geocode cache and offline gazetteer for city lookups.
+
+Places live in SQLite (geocode.db, next to search_history.db) with their
+bounding box and center, plus an alias table used for alternate spellings.
+The table is seeded with the hardcoded major cities. It grows from
+successful Nominatim lookups and can be bulk-loaded from a GeoNames-style
+TSV dump (e.g. PK.txt from https://download.geonames.org/export/dump/):
+
+    python geocode.py import PK.txt
+    python geocode.py lookup "rawalpindi"
+"""
+
+import argparse
+import difflib
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from storage import DATA_DIR, lazy_singletons
+
+
+GEOCODE_PATH = os.path.join(DATA_DIR, 'geocode.db')
+
+# Hardcoded coordinates for major Pakistani cities, used to seed the gazetteer
+CITY_COORDINATES = {
+    "karachi": {"center": [24.8607, 67.0011], "bbox": "24.5,66.8,25.2,67.2"},
+    "lahore": {"center": [31.5497, 74.3436], "bbox": "31.2,74.1,31.8,74.5"},
+    "islamabad": {"center": [33.6844, 73.0479], "bbox": "33.5,72.8,33.8,73.2"},
+    "sukkur": {"center": [27.7052, 68.8574], "bbox": "27.5,68.6,27.9,69.0"}
+}
+
+# Minimum similarity for a fuzzy match to count
+FUZZY_CUTOFF = 0.85
+
+# GeoNames feature classes worth resolving a "city" search to
+GEONAMES_FEATURE_CLASSES = {"P", "A"}
+
+
+def normalize_name(name):
+    """lowercase, strip accents and punctuation, collapse whitespace"""
+    name = unicodedata.normalize("NFKD", name or "")
+    name = "".join(ch for ch in name if not unicodedata.combining(ch)).lower()
+    name = re.sub(r"[^\w\s]", " ", name)
+    return " ".join(name.split())
+
+
+def bbox_around(lat, lon, population):
+    """approximate a city's bounding box from its population (GeoNames has no extents)"""
+    radius_km = min(30.0, max(3.0, math.sqrt(max(population, 0)) / 150))
+    dlat = radius_km / 111.0
+    dlon = radius_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+class Gazetteer:
+    """SQLite-backed city -> (bbox, center) lookup with alias and fuzzy matching"""
+
+    def __init__(self, path=GEOCODE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._alias_index = None
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _init_db(self):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''CREATE TABLE IF NOT EXISTS places (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, name_key TEXT UNIQUE, country TEXT,
+            south REAL, west REAL, north REAL, east REAL, lat REAL, lon REAL,
+            population INTEGER, source TEXT, updated_at REAL)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS aliases (
+            alias_key TEXT, place_id INTEGER, PRIMARY KEY (alias_key, place_id))''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_aliases_key ON aliases (alias_key)")
+        conn.commit()
+        seeded = c.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+        conn.close()
+        if not seeded:
+            for city, coords in CITY_COORDINATES.items():
+                south, west, north, east = map(float, coords["bbox"].split(","))
+                self.add_place(city, (south, west, north, east), coords["center"], source="builtin")
+
+    def add_place(self, name, bbox, center, source="nominatim", aliases=(), population=0, country="PK", conn=None):
+        """inserts or refreshes a place; bbox is (south, west, north, east)"""
+        own_conn = conn is None
+        if own_conn:
+            conn = self._connect()
+        key = normalize_name(name)
+        south, west, north, east = bbox
+        c = conn.cursor()
+        # Same name twice (e.g. GeoNames has several "Hyderabad"s): the more populous place wins, and a
+        # smaller namesake never moves its geometry
+        c.execute('''INSERT INTO places (name, name_key, country, south, west, north, east, lat, lon, population, source, updated_at)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     ON CONFLICT(name_key) DO UPDATE SET
+                        south=excluded.south, west=excluded.west, north=excluded.north, east=excluded.east,
+                        lat=excluded.lat, lon=excluded.lon, country=excluded.country, population=excluded.population,
+                        source=excluded.source, updated_at=excluded.updated_at
+                     WHERE excluded.population >= places.population''',
+                  (name, key, country, south, west, north, east, center[0], center[1], population, source, time.time()))
+        place_id = c.execute("SELECT id FROM places WHERE name_key = ?", (key,)).fetchone()[0]
+        alias_keys = {key} | {normalize_name(alias) for alias in aliases}
+        c.executemany("INSERT OR IGNORE INTO aliases (alias_key, place_id) VALUES (?, ?)",
+                      [(alias_key, place_id) for alias_key in alias_keys if alias_key])
+        if own_conn:
+            conn.commit()
+            conn.close()
+        self._alias_index = None
+        return place_id
+
+    def _load_alias_index(self):
+        # Alias keys bucketed by first letter keep fuzzy matching cheap on large gazetteers
+        with self._lock:
+            if self._alias_index is None:
+                conn = self._connect()
+                index = {}
+                for (alias_key,) in conn.execute("SELECT DISTINCT alias_key FROM aliases"):
+                    index.setdefault(alias_key[:1], []).append(alias_key)
+                conn.close()
+                self._alias_index = index
+            return self._alias_index
+
+    def _fetch(self, conn, alias_key):
+        # The most populous place wins when several share an alias
+        return conn.execute('''SELECT p.south, p.west, p.north, p.east, p.lat, p.lon, p.name
+                               FROM aliases a JOIN places p ON p.id = a.place_id
+                               WHERE a.alias_key = ? ORDER BY p.population DESC LIMIT 1''', (alias_key,)).fetchone()
+
+    def lookup(self, city_name):
+        """returns (bbox_str, center) for a known place, or (None, None)"""
+        key = normalize_name(city_name)
+        if not key:
+            return None, None
+        conn = self._connect()
+        try:
+            row = self._fetch(conn, key)
+            if row is None:
+                candidates = [k for k in self._load_alias_index().get(key[:1], []) if abs(len(k) - len(key)) <= 2]
+                matches = difflib.get_close_matches(key, candidates, n=1, cutoff=FUZZY_CUTOFF)
+                if matches:
+                    logging.info(f"Gazetteer fuzzy match for '{city_name}': '{matches[0]}'")
+                    row = self._fetch(conn, matches[0])
+        finally:
+            conn.close()
+        if row is None:
+            return None, None
+        south, west, north, east, lat, lon, _ = row
+        return f"{south},{west},{north},{east}", [lat, lon]
+
+    def country(self, city_name):
+        """ISO country code of a known place (exact name or alias only), or None"""
+        key = normalize_name(city_name)
+        if not key:
+            return None
+        conn = self._connect()
+        try:
+            row = conn.execute('''SELECT p.country FROM aliases a JOIN places p ON p.id = a.place_id
+                                  WHERE a.alias_key = ? ORDER BY p.population DESC LIMIT 1''', (key,)).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def import_geonames(self, tsv_path, country="PK", min_population=0):
+        """loads a GeoNames dump (tab separated, 19 columns); returns the number of places imported"""
+        conn = self._connect()
+        imported = 0
+        with open(tsv_path, encoding="utf-8") as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) < 15:
+                    continue
+                name, asciiname, alternatenames = fields[1], fields[2], fields[3]
+                feature_class, country_code = fields[6], fields[8]
+                if feature_class not in GEONAMES_FEATURE_CLASSES or (country and country_code != country):
+                    continue
+                population = int(fields[14] or 0)
+                if population < min_population:
+                    continue
+                lat, lon = float(fields[4]), float(fields[5])
+                aliases = [asciiname] + [alias for alias in alternatenames.split(",") if alias]
+                self.add_place(name, bbox_around(lat, lon, population), [lat, lon], source="geonames",
+                               aliases=aliases, population=population, country=country_code, conn=conn)
+                imported += 1
+        conn.commit()
+        conn.close()
+        self._alias_index = None
+        logging.info(f"Imported {imported} places from {tsv_path}")
+        return imported
+
+
+# geocode.gazetteer: the shared gazetteer, opened (and seeded) on first use
+__getattr__ = lazy_singletons(globals(), {"gazetteer": Gazetteer})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the offline gazetteer used for city lookups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_cmd = sub.add_parser("import", help="import a GeoNames-style TSV dump")
+    import_cmd.add_argument("path")
+    import_cmd.add_argument("--country", default="PK")
+    import_cmd.add_argument("--min-population", type=int, default=0)
+    lookup_cmd = sub.add_parser("lookup", help="resolve a city name")
+    lookup_cmd.add_argument("name")
+    args = parser.parse_args()
+
+    gazetteer = Gazetteer()
+    if args.command == "import":
+        count = gazetteer.import_geonames(args.path, args.country, args.min_population)
+        print(f"Imported {count} places into {gazetteer.path}")
+    else:
+        bbox, center = gazetteer.lookup(args.name)
+        print(f"{args.name}: bbox={bbox} center={center}" if bbox else f"{args.name}: not found")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Persistent on-disk cache for upstream JSON responses and scraped websites.
+
+Responses are stored in SQLite (http_cache.db, next to search_history.db) keyed
+by the normalized URL and query parameters. Each endpoint has its own TTL and
+the cache is kept under a size budget by evicting the least recently used rows.
+
+Business website pages are not stored, only what is needed to avoid
+downloading or parsing them again: their ETag/Last-Modified validators, a
+hash of the content and what was extracted from it (see PageCache).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+from storage import DATA_DIR, lazy_singletons
+
+
+CACHE_PATH = os.path.join(DATA_DIR, 'http_cache.db')
+
+DAY = 24 * 60 * 60
+
+# Time-to-live in seconds per endpoint
+ENDPOINT_TTLS = {
+    "nominatim": 30 * DAY,          # city boundaries rarely move
+    "overpass": 1 * DAY,
+    "rapidapi_search": 7 * DAY,     # RapidAPI free quota is ~500 requests/month
+    "rapidapi_details": 7 * DAY,
+    "google_search": 7 * DAY,
+    "google_details": 1 * DAY,      # reviews change more often
+}
+DEFAULT_TTL = 1 * DAY
+
+# Size budget before least recently used entries are evicted
+MAX_CACHE_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+
+# Website pages not seen for this long are dropped from the page cache
+PAGE_MAX_AGE = 90 * DAY
+
+# Query parameters that never take part in the cache key (credentials)
+IGNORED_PARAMS = {"key", "api_key", "apikey"}
+
+
+def normalize_key(url, params=None):
+    """builds a stable cache key from the URL and its query parameters"""
+    parts = urlsplit(url)
+    base = f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path.rstrip('/')}"
+    items = []
+    for name, value in sorted((params or {}).items()):
+        if name.lower() in IGNORED_PARAMS or value is None:
+            continue
+        items.append((name, " ".join(str(value).split())))
+    if parts.query:
+        items.append(("", parts.query))
+    raw = base + "?" + json.dumps(items, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed JSON response cache with per-endpoint TTLs and LRU eviction"""
+
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY, endpoint TEXT, url TEXT, body TEXT, size INTEGER,
+            created_at REAL, expires_at REAL, last_access REAL)''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+        conn.commit()
+        conn.close()
+
+    def _count(self, counter, endpoint):
+        with self._lock:
+            counter[endpoint] = counter.get(endpoint, 0) + 1
+
+    def get(self, url, params=None, endpoint="default"):
+        """returns the cached JSON data, or None on a miss or an expired entry"""
+        key = normalize_key(url, params)
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT body, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and row[1] > now:
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"Response cache read failed for {url}: {e}")
+            row = None
+        if not row or row[1] <= now:
+            self._count(self.misses, endpoint)
+            return None
+        self._count(self.hits, endpoint)
+        return json.loads(row[0])
+
+    def set(self, url, params, data, endpoint="default", ttl=None):
+        """stores JSON-serializable `data` for the endpoint's TTL"""
+        key = normalize_key(url, params)
+        body = json.dumps(data, ensure_ascii=False)
+        now = time.time()
+        ttl = ENDPOINT_TTLS.get(endpoint, DEFAULT_TTL) if ttl is None else ttl
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, url, body, len(body), now, now + ttl, now)
+            )
+            conn.commit()
+            self._evict(conn)
+            conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"Response cache write failed for {url}: {e}")
+
+    def _evict(self, conn):
+        # Drop expired rows first, then least recently used ones until under budget
+        conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            target = total - int(self.max_bytes * 0.9)
+            freed = 0
+            stale = []
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+                stale.append((key,))
+                freed += size
+                if freed >= target:
+                    break
+            conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+            logging.info(f"Response cache evicted {len(stale)} entries ({freed} bytes)")
+        conn.commit()
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute("DELETE FROM responses")
+        conn.commit()
+        conn.close()
+
+    def stats(self):
+        """hit/miss counters for this process plus the on-disk footprint"""
+        with self._lock:
+            hits = sum(self.hits.values())
+            misses = sum(self.misses.values())
+            endpoints = sorted(set(self.hits) | set(self.misses))
+            per_endpoint = {e: {"hits": self.hits.get(e, 0), "misses": self.misses.get(e, 0)} for e in endpoints}
+        try:
+            conn = self._connect()
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            conn.close()
+        except sqlite3.Error:
+            entries, size = 0, 0
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+            "endpoints": per_endpoint,
+        }
+
+
+class PageCache:
+    """validators, content hash and extracted contacts per business website page
+
+    Callers revalidate with conditional_headers(); a 304 means the stored
+    extraction is still current, and a 200 whose content hash matches the
+    stored one means the page does not need parsing again.
+    """
+
+    COUNTERS = ("requests", "not_modified", "unchanged", "changed", "bytes_downloaded", "bytes_saved")
+
+    def __init__(self, path=CACHE_PATH, max_age=PAGE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        conn = self._connect()
+        conn.execute('''CREATE TABLE IF NOT EXISTS pages (
+            key TEXT PRIMARY KEY, url TEXT, etag TEXT, last_modified TEXT, content_hash TEXT,
+            size INTEGER, extracted TEXT, checked_at REAL)''')
+        conn.execute("DELETE FROM pages WHERE checked_at <= ?", (time.time() - self.max_age,))
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.counters[name] += amount
+
+    def get(self, url):
+        """the stored entry for a page as a dict, or None"""
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT etag, last_modified, content_hash, size, extracted FROM pages WHERE key = ?",
+                               (normalize_key(url),)).fetchone()
+            conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"Page cache read failed for {url}: {e}")
+            return None
+        if row is None:
+            return None
+        etag, last_modified, content_hash, size, extracted = row
+        return {"etag": etag, "last_modified": last_modified, "content_hash": content_hash, "size": size,
+                "extracted": json.loads(extracted)}
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def not_modified(self, url, entry):
+        """records a 304 answer; returns the stored extraction"""
+        self._count(requests=1, not_modified=1, bytes_saved=entry["size"])
+        self._touch(url)
+        return entry["extracted"]
+
+    @staticmethod
+    def content_hash(content):
+        return hashlib.sha256(content.encode("utf-8", errors="replace")).hexdigest()
+
+    def store(self, url, headers, content_hash, size, extracted, entry=None):
+        """records a downloaded page; `entry` is what was cached before, if anything"""
+        unchanged = entry is not None and entry["content_hash"] == content_hash
+        self._count(requests=1, bytes_downloaded=size, unchanged=int(unchanged), changed=int(not unchanged))
+        try:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (normalize_key(url), url, headers.get("ETag"), headers.get("Last-Modified"), content_hash,
+                          size, json.dumps(extracted, ensure_ascii=False), time.time()))
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"Page cache write failed for {url}: {e}")
+
+    def _touch(self, url):
+        try:
+            conn = self._connect()
+            conn.execute("UPDATE pages SET checked_at = ? WHERE key = ?", (time.time(), normalize_key(url)))
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"Page cache write failed for {url}: {e}")
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute("DELETE FROM pages")
+        conn.commit()
+        conn.close()
+
+    def stats(self, since=None):
+        """counters for this process, or only what happened after an earlier stats() snapshot"""
+        with self._lock:
+            counters = dict(self.counters)
+        if since:
+            counters = {name: value - since.get(name, 0) for name, value in counters.items()}
+        hits = counters["not_modified"] + counters["unchanged"]
+        counters["hits"] = hits
+        counters["hit_rate"] = round(hits / counters["requests"], 3) if counters["requests"] else 0.0
+        return counters
+
+
+# http_cache.cache and http_cache.pages: the shared stores, opened on first use
+__getattr__ = lazy_singletons(globals(), {"cache": ResponseCache, "pages": PageCache})
@@ -0,0 +1,80 @@
+"""Pooled HTTP client shared by every upstream call.
+
+One requests.Session keeps TLS connections alive between requests. Each
+upstream host gets its own adapter, so it has its own pool size and retry
+policy. Transient failures (5xx, and 429 where retrying is useful) are
+retried with exponential backoff.
+"""
+
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+USER_AGENT = "BusinessScraperApp/1.0 (Mozilla/5.0; compatible)"
+
+# Longest Retry-After we are willing to sleep for inside a single request
+MAX_RETRY_AFTER = 10
+
+# Connections kept open per host; the default also applies to scraped websites
+DEFAULT_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+
+# Per-host pool size and retried status codes
+HOST_POLICIES = {
+    "https://nominatim.openstreetmap.org": {"pool_size": 2, "status_forcelist": (429, 500, 502, 503, 504)},
+    "http://overpass-api.de": {"pool_size": 2, "status_forcelist": (429, 502, 503, 504)},
+    "https://overpass-api.de": {"pool_size": 2, "status_forcelist": (429, 502, 503, 504)},
+    # A RapidAPI 429 means the monthly quota is gone, retrying only burns time
+    "https://local-business-data.p.rapidapi.com": {"pool_size": 8, "status_forcelist": (500, 502, 503, 504)},
+    "https://maps.googleapis.com": {"pool_size": 8, "status_forcelist": (429, 500, 502, 503, 504)},
+}
+DEFAULT_STATUS_FORCELIST = (429, 500, 502, 503, 504)
+
+
+class CappedRetry(Retry):
+    """Retry that never sleeps longer than MAX_RETRY_AFTER for a Retry-After header"""
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, MAX_RETRY_AFTER)
+
+
+def build_retry(status_forcelist=DEFAULT_STATUS_FORCELIST, total=3, backoff_factor=0.5):
+    """exponential backoff: 0.5 s, 1 s, 2 s between attempts"""
+    return CappedRetry(
+        total=total,
+        connect=total,
+        read=1,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        # Hand the final 429/5xx back to the caller instead of raising RetryError
+        raise_on_status=False,
+    )
+
+
+def build_session(pool_size=DEFAULT_POOL_SIZE):
+    """creates a keep-alive session with per-host connection pools and retries"""
+    session = requests.Session()
+    session.headers.update({
+        "User-Agent": USER_AGENT,
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    })
+    # pool_connections is the number of distinct host pools kept around
+    default_adapter = HTTPAdapter(pool_connections=64, pool_maxsize=pool_size, max_retries=build_retry())
+    session.mount("http://", default_adapter)
+    session.mount("https://", default_adapter)
+    for prefix, policy in HOST_POLICIES.items():
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=policy["pool_size"],
+            max_retries=build_retry(policy["status_forcelist"]),
+        )
+        session.mount(prefix, adapter)
+    return session
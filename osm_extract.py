@@ -0,0 +1,234 @@
+"""Local OpenStreetMap POI index, an offline alternative to the Overpass API.
+
+A Pakistan extract (OSM PBF from e.g. Geofabrik, or a GeoJSON export) is read
+once and every amenity is written to a compact SQLite file with an R-tree
+spatial index:
+
+    python osm_extract.py build pakistan-latest.osm.pbf
+    python osm_extract.py query 24.5,66.8,25.2,67.2 --amenity hospital
+
+Queries return elements shaped like Overpass 'out center' output, so the rest
+of the pipeline does not care which backend produced them. Reading PBF files
+needs the optional pyosmium package; GeoJSON needs nothing extra.
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from functools import lru_cache
+
+from storage import DATA_DIR
+
+
+EXTRACT_DB_PATH = os.getenv("OSM_EXTRACT_DB", os.path.join(DATA_DIR, 'osm_pois.db'))
+
+
+@lru_cache(maxsize=64)
+def _compile(pattern):
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def _regexp_i(pattern, value):
+    # Overpass ["name"~"...",i] semantics: case-insensitive search, missing tag never matches
+    return value is not None and _compile(pattern).search(value) is not None
+
+
+def _center(coordinates):
+    """bounding-box center of a (possibly nested) GeoJSON coordinate array, like Overpass 'out center'"""
+    lats, lons = [], []
+
+    def walk(coords):
+        if coords and isinstance(coords[0], (int, float)):
+            lons.append(coords[0])
+            lats.append(coords[1])
+        else:
+            for item in coords:
+                walk(item)
+
+    walk(coordinates)
+    if not lats:
+        return None
+    return (min(lats) + max(lats)) / 2, (min(lons) + max(lons)) / 2
+
+
+class PoiIndex:
+    """SQLite store of OSM amenities with an R-tree on their coordinates"""
+
+    def __init__(self, path=EXTRACT_DB_PATH):
+        self.path = path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.create_function("regexp_i", 2, _regexp_i, deterministic=True)
+        return conn
+
+    def exists(self):
+        """True once build() has written the index (an empty or half-created file does not count)"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            # Read-only, so checking never creates the file
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=10)
+            try:
+                return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'poi_rtree'").fetchone() is not None
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return False
+
+    def _create(self, conn):
+        conn.execute("DROP TABLE IF EXISTS pois")
+        conn.execute("DROP TABLE IF EXISTS poi_rtree")
+        conn.execute('''CREATE TABLE pois (
+            id INTEGER PRIMARY KEY, osm_type TEXT, osm_id INTEGER, amenity TEXT, name TEXT,
+            tags TEXT, lat REAL, lon REAL)''')
+        conn.execute("CREATE VIRTUAL TABLE poi_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)")
+
+    def _insert(self, conn, batch):
+        conn.executemany("INSERT INTO pois VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        conn.executemany("INSERT INTO poi_rtree VALUES (?, ?, ?, ?, ?)",
+                         [(row[0], row[6], row[6], row[7], row[7]) for row in batch])
+
+    def build(self, source_path, batch_size=5000):
+        """(re)builds the index from a .osm.pbf or .geojson extract; returns the number of POIs"""
+        started = time.perf_counter()
+        conn = self._connect()
+        self._create(conn)
+        batch = []
+        count = 0
+        reader = self._read_pbf if source_path.endswith(".pbf") else self._read_geojson
+        for osm_type, osm_id, tags, lat, lon in reader(source_path):
+            count += 1
+            batch.append((count, osm_type, osm_id, tags.get("amenity"), tags.get("name"),
+                          json.dumps(tags, ensure_ascii=False, separators=(",", ":")), lat, lon))
+            if len(batch) >= batch_size:
+                self._insert(conn, batch)
+                batch = []
+        if batch:
+            self._insert(conn, batch)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_pois_amenity ON pois (amenity)")
+        conn.commit()
+        conn.execute("VACUUM")
+        conn.close()
+        logging.info(f"Built OSM POI index with {count} amenities in {time.perf_counter() - started:.1f}s")
+        return count
+
+    def _read_geojson(self, path):
+        with open(path, encoding="utf-8") as f:
+            features = json.load(f).get("features", [])
+        for feature in features:
+            properties = dict(feature.get("properties") or {})
+            tags = properties.pop("tags", None) or properties
+            if "amenity" not in tags:
+                continue
+            # osmium export / overpass turbo write ids as "node/123"
+            ref = str(feature.get("id") or properties.get("@id") or "")
+            osm_type, _, osm_id = ref.partition("/")
+            geometry = feature.get("geometry") or {}
+            center = _center(geometry.get("coordinates") or [])
+            if center is None:
+                continue
+            tags = {k: v for k, v in tags.items() if not k.startswith("@") and isinstance(v, str)}
+            yield osm_type or "node", int(osm_id) if osm_id.isdigit() else 0, tags, center[0], center[1]
+
+    def _read_pbf(self, path):
+        try:
+            import osmium
+        except ImportError:
+            raise RuntimeError("Reading .osm.pbf extracts requires pyosmium (pip install osmium)")
+
+        pois = []
+
+        class AmenityHandler(osmium.SimpleHandler):
+            def node(self, n):
+                if "amenity" in n.tags and n.location.valid():
+                    pois.append(("node", n.id, dict(n.tags), n.location.lat, n.location.lon))
+
+            def way(self, w):
+                if "amenity" not in w.tags:
+                    return
+                locations = [node.location for node in w.nodes if node.location.valid()]
+                if locations:
+                    lat = (min(l.lat for l in locations) + max(l.lat for l in locations)) / 2
+                    lon = (min(l.lon for l in locations) + max(l.lon for l in locations)) / 2
+                    pois.append(("way", w.id, dict(w.tags), lat, lon))
+
+            def area(self, a):
+                # Closed ways are handled in way(); only multipolygon relations remain
+                if a.from_way() or "amenity" not in a.tags:
+                    return
+                locations = [node.location for ring in a.outer_rings() for node in ring if node.location.valid()]
+                if locations:
+                    lat = (min(l.lat for l in locations) + max(l.lat for l in locations)) / 2
+                    lon = (min(l.lon for l in locations) + max(l.lon for l in locations)) / 2
+                    pois.append(("relation", a.orig_id(), dict(a.tags), lat, lon))
+
+        AmenityHandler().apply_file(path, locations=True)
+        return pois
+
+    def query(self, bbox, amenity=None, name_pattern=None, limit=None):
+        """returns Overpass-shaped elements inside a "south,west,north,east" bbox"""
+        if not self.exists():
+            raise RuntimeError(f"No OSM POI index at {self.path}; build one with: python osm_extract.py build <extract.osm.pbf>")
+        south, west, north, east = map(float, bbox.split(","))
+        sql = '''SELECT p.osm_type, p.osm_id, p.tags, p.lat, p.lon FROM poi_rtree r JOIN pois p ON p.id = r.id
+                 WHERE r.min_lat >= ? AND r.max_lat <= ? AND r.min_lon >= ? AND r.max_lon <= ?'''
+        params = [south, north, west, east]
+        if amenity:
+            sql += " AND p.amenity = ?"
+            params.append(amenity)
+        if name_pattern:
+            sql += " AND regexp_i(?, p.name)"
+            params.append(name_pattern)
+        # Same order as Overpass 'out center' (asc): nodes, ways, relations, each by id, so both
+        # backends return the same first `limit` elements
+        sql += " ORDER BY CASE p.osm_type WHEN 'node' THEN 0 WHEN 'way' THEN 1 ELSE 2 END, p.osm_id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        conn = self._connect()
+        rows = conn.execute(sql, params).fetchall()
+        conn.close()
+        elements = []
+        for osm_type, osm_id, tags, lat, lon in rows:
+            element = {"type": osm_type, "id": osm_id}
+            if osm_type == "node":
+                element.update(lat=lat, lon=lon)
+            else:
+                element["center"] = {"lat": lat, "lon": lon}
+            element["tags"] = json.loads(tags)
+            elements.append(element)
+        return elements
+
+
+index = PoiIndex()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local OSM POI index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build", help="index an .osm.pbf or .geojson extract")
+    build_cmd.add_argument("source")
+    query_cmd = sub.add_parser("query", help="list POIs in a south,west,north,east bbox")
+    query_cmd.add_argument("bbox")
+    query_cmd.add_argument("--amenity")
+    query_cmd.add_argument("--name")
+    query_cmd.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(f"Indexed {index.build(args.source)} amenities into {index.path}")
+    else:
+        started = time.perf_counter()
+        elements = index.query(args.bbox, args.amenity, args.name, args.limit)
+        for element in elements:
+            print(json.dumps(element, ensure_ascii=False))
+        print(f"{len(elements)} elements in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Phone number normalization with a memo cache and a batch API.
+
+normalize() parses one raw string into E.164 plus the international and
+national formats. Results are kept in a bounded LRU cache, because the same
+numbers come back from RapidAPI, OSM tags and scraped websites again and
+again. normalize_many() takes a whole column: values with too few or too many
+digits are rejected with a vectorized count first, and each distinct value is only
+parsed once.
+
+The default region comes from region_for(city): an explicit use_region()
+override for the current search, then PHONE_REGIONS
+(e.g. "dubai=AE,london=GB"), then the gazetteer's country for the city,
+then PHONE_REGION (default PK).
+
+    python phones.py "0300 1234567" "+44 20 7946 0958" --region PK
+    python phones.py --benchmark 100000
+"""
+
+import argparse
+import contextlib
+import contextvars
+import os
+import random
+import re
+import time
+from functools import lru_cache
+from typing import NamedTuple
+
+
+DEFAULT_REGION = os.getenv("PHONE_REGION", "PK")
+
+# City -> region overrides, e.g. PHONE_REGIONS="dubai=AE,london=GB"
+CITY_REGIONS = dict(item.split("=", 1) for item in os.getenv("PHONE_REGIONS", "").replace(" ", "").split(",") if "=" in item)
+
+# Distinct (raw, region) pairs remembered by normalize()
+PHONE_CACHE_SIZE = int(os.getenv("PHONE_CACHE_SIZE", "50000"))
+
+# E.164 allows at most 15 digits; nothing shorter than a local landline is worth parsing
+MIN_DIGITS = 7
+MAX_DIGITS = 15
+
+DIGIT_RE = re.compile(r"\d")
+
+
+class PhoneNumber(NamedTuple):
+    e164: str
+    international: str
+    national: str
+
+
+# Region for the current search, set by use_region(); worker threads inherit it via copied contexts
+_region = contextvars.ContextVar("phone_region", default=None)
+
+
+@contextlib.contextmanager
+def use_region(region):
+    """overrides the region for every lookup in this context, e.g. for one query"""
+    token = _region.set(region.upper() if region else None)
+    try:
+        yield
+    finally:
+        _region.reset(token)
+
+
+def region_for(city=None):
+    """region used to parse numbers that have no country code"""
+    override = _region.get()
+    if override:
+        return override
+    if not city:
+        return DEFAULT_REGION
+    return _city_region(" ".join(city.lower().split()))
+
+
+@lru_cache(maxsize=1024)
+def _city_region(city):
+    if city in CITY_REGIONS:
+        return CITY_REGIONS[city].upper()
+    from geocode import gazetteer
+    return gazetteer.country(city) or DEFAULT_REGION
+
+
+def plausible(raw):
+    """cheap check that a value could be a phone number at all; labels like "Tel:" or "UAN" are left
+    for phonenumbers to handle"""
+    if not isinstance(raw, str):
+        return False
+    return MIN_DIGITS <= len(DIGIT_RE.findall(raw)) <= MAX_DIGITS
+
+
+@lru_cache(maxsize=PHONE_CACHE_SIZE)
+def _parse(raw, region):
+    import phonenumbers  # imported lazily to keep start-up fast
+    try:
+        number = phonenumbers.parse(raw, region)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_valid_number(number):
+        return None
+    return PhoneNumber(
+        phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164),
+        phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.INTERNATIONAL),
+        phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.NATIONAL),
+    )
+
+
+def normalize(raw, region=None):
+    """PhoneNumber for a valid number, None for anything else"""
+    if not plausible(raw):
+        return None
+    return _parse(raw.strip(), (region or region_for()).upper())
+
+
+def normalize_many(values, region=None):
+    """normalizes a column of raw numbers; returns a DataFrame (raw, e164, international, national, valid)
+    aligned with the input"""
+    import pandas as pd
+    values = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    region = (region or region_for()).upper()
+    text = values.where(values.map(lambda value: isinstance(value, str)), "").str.strip()
+    # Vectorized pre-filter, so only plausible values reach the parser
+    digits = text.str.count(r"\d")
+    candidates = digits.between(MIN_DIGITS, MAX_DIGITS)
+    parsed = {raw: _parse(raw, region) for raw in pd.unique(text[candidates])}
+    matched = text.where(candidates)
+    frame = pd.DataFrame({"raw": values}, index=values.index)
+    for name in PhoneNumber._fields:
+        column = matched.map({raw: getattr(number, name) for raw, number in parsed.items() if number is not None})
+        frame[name] = column.astype(object).where(column.notna(), None)
+    frame["valid"] = frame["e164"].notna()
+    return frame
+
+
+def cache_info():
+    return _parse.cache_info()
+
+
+def _legacy_validate(raw, region):
+    # What validate_phone_number did before: parse, validate and format every call
+    import phonenumbers
+    try:
+        number = phonenumbers.parse(raw, region)
+        if phonenumbers.is_valid_number(number):
+            return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.INTERNATIONAL)
+        return "Invalid"
+    except phonenumbers.NumberParseException:
+        return "Invalid"
+
+
+def _synthetic_column(n, distinct=2000, seed=7):
+    rng = random.Random(seed)
+    pool = []
+    for i in range(distinct):
+        kind = i % 5
+        if kind == 0:
+            pool.append(f"+92 21 {rng.randrange(10 ** 7):07d}")
+        elif kind == 1:
+            pool.append(f"03{rng.randrange(10):d}{rng.randrange(10 ** 8):08d}")
+        elif kind == 2:
+            pool.append(f"0{rng.randrange(21, 99)}-{rng.randrange(10 ** 7):07d}")
+        elif kind == 3:
+            pool.append(rng.choice(["N/A", "", "call us", "info@example.pk", "12", "Mon-Sat 9:00"]))
+        else:
+            pool.append(f"+1 212 555 {rng.randrange(10 ** 4):04d}")
+    return [rng.choice(pool) for _ in range(n)]
+
+
+def benchmark(n, region=DEFAULT_REGION):
+    """per-row parsing against normalize_many on a column with repeats and garbage"""
+    column = _synthetic_column(n)
+    started = time.perf_counter()
+    legacy = [_legacy_validate(raw, region) for raw in column]
+    legacy_seconds = time.perf_counter() - started
+    _parse.cache_clear()
+    started = time.perf_counter()
+    frame = normalize_many(column, region)
+    batch_seconds = time.perf_counter() - started
+    agree = sum((row or "Invalid") == old for row, old in zip(frame["international"], legacy))
+    print(f"{n} values, {len(set(column))} distinct, region {region}")
+    print(f"  per-row parse    {legacy_seconds:6.2f} s")
+    print(f"  normalize_many   {batch_seconds:6.2f} s  ({cache_info().currsize} parsed, {agree}/{n} agree)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize phone numbers to E.164 and display formats")
+    parser.add_argument("numbers", nargs="*")
+    parser.add_argument("--region", default=None, help=f"default region for numbers without a country code (default {DEFAULT_REGION})")
+    parser.add_argument("--city", help="take the region from this city instead")
+    parser.add_argument("--benchmark", type=int, metavar="ROWS")
+    args = parser.parse_args()
+
+    region = args.region or region_for(args.city)
+    if args.benchmark:
+        benchmark(args.benchmark, region)
+        return
+    print(normalize_many(args.numbers, region).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Process-wide token-bucket rate limiting for the upstream APIs.
+
+Buckets live at module level, so every Streamlit session and every worker
+thread in the process shares them. Rates can be overridden per bucket with
+RATE_LIMIT_<NAME>=<requests per second>[:<burst>], e.g. RATE_LIMIT_RAPIDAPI=2:5.
+A rate set for one bucket in code (configure, slow_down) takes precedence.
+"""
+
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+
+# (requests per second, burst capacity) per upstream
+DEFAULT_RATES = {
+    "nominatim": (1.0, 1),      # Nominatim usage policy: max 1 request per second
+    "overpass": (1.0, 2),
+    "rapidapi": (1.0, 1),       # Local Business Data API
+    "google": (1.0, 1),         # Google Places API
+    "website": (1.0, 2),        # applied per scraped host
+}
+
+
+class TokenBucket:
+    """refills `rate` tokens per second up to `capacity` and tracks time spent waiting"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        """blocks until `tokens` are available, returns the seconds waited"""
+        with self._lock:
+            self._refill(time.monotonic())
+            # Reserve the tokens now (the balance may go negative) so callers
+            # queue up in order without holding the lock while they sleep
+            self._tokens -= tokens
+            delay = max(0.0, -self._tokens / self.rate)
+            self.requests += 1
+            if delay > 0:
+                self.waits += 1
+                self.wait_seconds += delay
+                self.max_wait = max(self.max_wait, delay)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def try_acquire(self, tokens=1):
+        """takes `tokens` without blocking; returns 0 on success, otherwise the seconds until they are available"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                self.requests += 1
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def slow_down(self, rate, capacity=None):
+        """lowers the rate (and optionally the burst) in place; tokens already in the bucket are kept, never added"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.rate, float(rate))
+            if capacity is not None:
+                self.capacity = min(self.capacity, float(capacity))
+                self._tokens = min(self._tokens, self.capacity)
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "capacity": self.capacity,
+            "requests": self.requests,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "max_wait": round(self.max_wait, 3),
+        }
+
+
+class RateLimiter:
+    """registry of named token buckets, created on first use"""
+
+    def __init__(self, rates=None):
+        self.rates = dict(DEFAULT_RATES)
+        if rates:
+            self.rates.update(rates)
+        # Set with configure()/slow_down() for one bucket; these win over RATE_LIMIT_<NAME>
+        self._configured = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def configure(self, name, rate, capacity=1):
+        """sets the rate for `name`; replaces the bucket if it already exists"""
+        with self._lock:
+            self._configured[name] = (rate, capacity)
+            self._buckets.pop(name, None)
+
+    def slow_down(self, name, rate, capacity=1):
+        """caps the rate of `name` (e.g. at a site's Crawl-delay) without refilling its bucket"""
+        bucket = self.bucket(name)
+        bucket.slow_down(rate, capacity)
+        with self._lock:
+            self._configured[name] = (bucket.rate, bucket.capacity)
+        return bucket
+
+    def _rate_for(self, name):
+        if name in self._configured:
+            return self._configured[name]
+        # Per-host buckets such as "website:example.com" use the "website" rate
+        base = name.split(":", 1)[0]
+        override = os.getenv(f"RATE_LIMIT_{base.upper()}")
+        if override:
+            rate, _, capacity = override.partition(":")
+            return float(rate), float(capacity or 1)
+        return self.rates.get(name) or self.rates.get(base) or (1.0, 1)
+
+    def bucket(self, name):
+        with self._lock:
+            bucket = self._buckets.get(name)
+            if bucket is None:
+                bucket = self._buckets[name] = TokenBucket(*self._rate_for(name))
+            return bucket
+
+    def acquire(self, name, tokens=1):
+        return self.bucket(name).acquire(tokens)
+
+    def try_acquire(self, name, tokens=1):
+        return self.bucket(name).try_acquire(tokens)
+
+    def acquire_for_url(self, url, prefix="website"):
+        """rate limits per host, e.g. one bucket per scraped business website"""
+        host = urlparse(url).netloc.lower() or url
+        return self.acquire(f"{prefix}:{host}")
+
+    def stats(self):
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {name: bucket.stats() for name, bucket in sorted(buckets.items())}
+
+    def total_wait_seconds(self):
+        return round(sum(s["wait_seconds"] for s in self.stats().values()), 3)
+
+
+limiter = RateLimiter()
+
+
+def acquire(name, tokens=1):
+    """blocks on the shared process-wide bucket `name`"""
+    return limiter.acquire(name, tokens)
+
+
+def acquire_for_url(url, prefix="website"):
+    return limiter.acquire_for_url(url, prefix)
@@ -0,0 +1,180 @@
+"""Typed business record shared by the OSM pipeline and the Google Maps scraper.
+
+Missing values are None, never the "N/A" placeholder, and coordinates and
+review figures are numbers. RecordColumns collects records straight into
+per-field arrays, so a DataFrame or an Arrow table is built in one step
+without turning every row into a dict first.
+
+    python records.py --benchmark 200000
+"""
+
+import argparse
+import math
+import time
+import tracemalloc
+from dataclasses import dataclass, fields
+
+
+# Placeholders older code used for "no value"
+MISSING_MARKERS = {"", "N/A", "n/a", "nan", "None"}
+
+# Old field names still found in checkpoints and batch state files
+LEGACY_FIELDS = {"phone_number": "phone"}
+
+# Output columns of the OpenStreetMap pipeline and of the Google Maps scraper, in display order
+OSM_COLUMNS = ("name", "latitude", "longitude", "phone", "email", "opening_hours", "website", "reviews_comments")
+MAPS_COLUMNS = ("name", "address", "website", "phone", "reviews_count", "reviews_average")
+
+
+@dataclass(slots=True)
+class BusinessRecord:
+    """one business; every field is optional"""
+    name: str = None
+    address: str = None
+    latitude: float = None
+    longitude: float = None
+    phone: str = None
+    email: str = None
+    opening_hours: str = None
+    website: str = None
+    reviews_count: int = None
+    reviews_average: float = None
+    reviews_comments: str = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """builds a record from a row dict, mapping placeholders to None and coercing numbers"""
+        values = {}
+        for key, value in data.items():
+            key = LEGACY_FIELDS.get(key, key)
+            if key in FIELD_TYPES:
+                values[key] = FIELD_TYPES[key](value)
+        return cls(**values)
+
+    def to_dict(self, columns=None):
+        return {column: getattr(self, column) for column in columns or FIELDS}
+
+
+def _text(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    value = str(value)
+    return None if value.strip() in MISSING_MARKERS else value
+
+
+def _float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def _int(value):
+    if isinstance(value, str):
+        value = value.replace(",", "")
+    value = _float(value)
+    return None if value is None else int(value)
+
+
+FIELDS = tuple(f.name for f in fields(BusinessRecord))
+FIELD_TYPES = {name: _text for name in FIELDS}
+FIELD_TYPES.update(latitude=_float, longitude=_float, reviews_average=_float, reviews_count=_int)
+
+# Column dtypes: nullable integer for counts, NaN-backed floats, object for text
+PANDAS_DTYPES = {name: object for name in FIELDS}
+PANDAS_DTYPES.update(latitude="float64", longitude="float64", reviews_average="float64", reviews_count="Int64")
+
+
+def arrow_schema(columns=None):
+    import pyarrow as pa  # optional, only needed for Arrow/Parquet output
+    types = {name: pa.string() for name in FIELDS}
+    types.update(latitude=pa.float64(), longitude=pa.float64(), reviews_average=pa.float64(), reviews_count=pa.int32())
+    return pa.schema([(column, types[column]) for column in columns or FIELDS])
+
+
+class RecordColumns:
+    """per-field arrays filled record by record, turned into a DataFrame or Arrow table in one step"""
+
+    def __init__(self, records=(), columns=None):
+        self.columns = tuple(columns or FIELDS)
+        self._data = {column: [] for column in self.columns}
+        self.extend(records)
+
+    def append(self, record):
+        for column in self.columns:
+            self._data[column].append(getattr(record, column))
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return len(self._data[self.columns[0]]) if self.columns else 0
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame({column: pd.array(self._data[column], dtype=PANDAS_DTYPES[column])
+                             for column in self.columns})
+
+    def to_arrow(self):
+        import pyarrow as pa
+        schema = arrow_schema(self.columns)
+        return pa.table([pa.array(self._data[column], type=schema.field(column).type) for column in self.columns],
+                        schema=schema)
+
+
+def _synthetic_row(i):
+    # What enrich_business used to return: "N/A" for everything it could not find
+    return {
+        "name": f"business {i}",
+        "latitude": 24.8 + i * 1e-6,
+        "longitude": 67.0 + i * 1e-6,
+        "phone": f"+92 21 {i:07d}" if i % 3 else "N/A",
+        "email": "N/A",
+        "opening_hours": "9:00 AM - 5:00 PM (assumed, please verify)" if i % 2 else "N/A",
+        "website": f"https://example{i}.pk" if i % 4 == 0 else "N/A",
+        "reviews_comments": "N/A",
+    }
+
+
+def _measure(build):
+    tracemalloc.start()
+    started = time.perf_counter()
+    df = build()
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, df.memory_usage(deep=True).sum()
+
+
+def benchmark(n):
+    """compares dict rows + pd.DataFrame(rows) against records + RecordColumns for n rows"""
+    import pandas as pd
+    columns = list(_synthetic_row(0))
+
+    def dict_rows():
+        rows = [_synthetic_row(i) for i in range(n)]
+        return pd.DataFrame(rows)
+
+    def record_columns():
+        builder = RecordColumns(columns=columns)
+        for i in range(n):
+            builder.append(BusinessRecord.from_dict(_synthetic_row(i)))
+        return builder.to_dataframe()
+
+    print(f"{n} rows")
+    for label, build in (("dicts + DataFrame(rows)", dict_rows), ("records + RecordColumns", record_columns)):
+        seconds, peak, frame_bytes = _measure(build)
+        print(f"  {label:<25} build {seconds:6.2f} s  peak {peak / 1e6:7.1f} MB  DataFrame {frame_bytes / 1e6:7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory benchmark for business row representations")
+    parser.add_argument("--benchmark", type=int, default=100000, metavar="ROWS")
+    args = parser.parse_args()
+    benchmark(args.benchmark)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,755 @@
+"""Headless business scraping core: geocode, query OpenStreetMap, enrich, export.
+
+Everything the Streamlit UI (app.py) and the batch runner need, with no
+Streamlit dependency, so it can run from cron or worker processes:
+
+    python -m scraper_core "karachi hospitals" -n 10 -o karachi_hospitals.csv
+
+Heavy optional libraries (phonenumbers, pandas, HTML parsers) are imported on first
+use. Cold start target: importing this module should take under
+COLD_START_TARGET_SECONDS. Check it with --startup-time, or break it down
+with: python -X importtime -c "import scraper_core"
+"""
+
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import argparse
+import contextvars
+import csv
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import replace
+
+import requests
+from dotenv import load_dotenv
+
+import rate_limiter
+import http_cache
+import http_client
+import geocode
+import entities
+import osm_extract
+import phones
+from records import BusinessRecord, RecordColumns, OSM_COLUMNS
+
+# Load environment variables
+load_dotenv()
+
+# RapidAPI key for Local Business Data API
+RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY", "4028e8ecb3mshc7917ff39380476p12eeefjsn1f86bf9f2996")
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+# Budget for "import scraper_core" on a warm disk
+COLD_START_TARGET_SECONDS = 0.3
+
+# Number of businesses enriched in parallel by fetch_osm_businesses
+ENRICH_WORKERS = int(os.getenv("ENRICH_WORKERS", "8"))
+
+# Where OSM elements come from: "overpass" (overpass-api.de) or "local" (osm_extract index)
+OSM_BACKEND = os.getenv("OSM_BACKEND", "overpass")
+
+# Pooled keep-alive HTTP session shared by every caller and worker thread in the process
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = http_client.build_session()
+        return _http_session
+
+# Use an externally managed session (e.g. one held in st.cache_resource)
+def set_http_session(session):
+    global _http_session
+    with _http_session_lock:
+        _http_session = session
+
+# Receiver for user-facing warnings, set per caller (e.g. the Streamlit script thread).
+# Worker threads inherit it because tasks are submitted with a copy of the caller's context.
+_notifier = contextvars.ContextVar("notifier", default=None)
+
+def set_notifier(handler):
+    _notifier.set(handler)
+
+# Log a user-facing message and pass it to the current notifier as (level, message)
+def notify(level, message):
+    logging.log(logging.ERROR if level == "error" else logging.WARNING, message)
+    handler = _notifier.get()
+    if handler is not None:
+        handler(level, message)
+
+# GET a JSON endpoint through the persistent response cache and the shared rate limiter
+def get_json(endpoint, limiter_name, url, params=None, headers=None, timeout=5, cacheable=None):
+    data = http_cache.cache.get(url, params, endpoint)
+    if data is not None:
+        logging.info(f"Response cache hit for {endpoint}: {url}")
+        return data
+    rate_limiter.acquire(limiter_name)
+    response = get_http_session().get(url, params=params, headers=headers, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    if cacheable is None or cacheable(data):
+        http_cache.cache.set(url, params, data, endpoint)
+    return data
+
+# Check whether a failed request was rejected for exceeding the quota
+def is_rate_limited(error):
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code == 429
+
+# Format a phone number for display ("Invalid" if it cannot be parsed); parsing is memoized in phones.
+# region defaults to the one set for the current search, see phones.region_for.
+def validate_phone_number(phone, region=None):
+    if phone == "N/A":
+        return "N/A"
+    number = phones.normalize(phone, region)
+    return number.international if number else "Invalid"
+
+# Get bounding box and center for a city from the local gazetteer, falling back to Nominatim
+def get_city_bbox(city_name):
+    # Known places (builtin, imported or previously geocoded) never touch the network
+    bbox_str, center = geocode.gazetteer.lookup(city_name)
+    if bbox_str:
+        logging.info(f"Using gazetteer coordinates for {city_name}")
+        return bbox_str, center
+
+    nominatim_url = "https://nominatim.openstreetmap.org/search"
+    headers = {"User-Agent": "BusinessScraperApp/1.0"}
+    
+    # List of queries to try
+    queries = [
+        city_name,                    # e.g., "sukkur"
+        f"{city_name}, Pakistan",     # e.g., "sukkur, Pakistan"
+        f"{city_name}, Sindh"         # e.g., "sukkur, Sindh"
+    ]
+    
+    for i, query in enumerate(queries):
+        params = {
+            "q": query,
+            "format": "json",
+            "bounded": "1",
+            "limit": "1",
+        }
+        
+        try:
+            data = get_json("nominatim", "nominatim", nominatim_url, params=params, headers=headers, timeout=5)
+            
+            logging.info(f"Nominatim API response for query '{query}' (attempt {i+1}): {data}")
+            
+            if not data or not isinstance(data, list):
+                logging.warning(f"No valid data returned from Nominatim for query '{query}'")
+                continue
+            
+            # Find a result that matches the city name and is in Pakistan
+            for entry in data:
+                display_name = entry.get("display_name", "").lower()
+                # Check if the city name is in the display name and it's in Pakistan
+                if city_name.lower() in display_name and "pakistan" in display_name:
+                    bbox = entry.get("boundingbox")
+                    if bbox:
+                        south, north, west, east = map(float, bbox)
+                        bbox_str = f"{south},{west},{north},{east}"
+                        center = [float(entry.get("lat")), float(entry.get("lon"))]
+                        logging.info(f"Found city {city_name} with display_name: {display_name}")
+                        geocode.gazetteer.add_place(city_name, (south, west, north, east), center, source="nominatim",
+                                                    aliases=[entry.get("name", "")])
+                        return bbox_str, center
+                    else:
+                        logging.warning(f"No bounding box found for city {city_name} in entry: {entry}")
+            
+            logging.info(f"No matching city found for query '{query}'")
+        
+        except requests.RequestException as e:
+            logging.error(f"Error fetching city bbox from Nominatim for query '{query}': {str(e)}")
+            continue
+    
+    logging.error(f"City {city_name} not found in the gazetteer or on Nominatim.")
+    return None, None
+
+# Note a failed upstream call (quota, timeout, HTTP error) in the caller's `failures` list, if it passed one.
+# A business with failures is not marked as enriched, so it is retried instead of reused.
+def _record_failure(failures, stage):
+    if failures is not None:
+        failures.append(stage)
+
+# Search for businesses using Local Business Data API
+def search_local_business(business_name, business_type, city, failures=None):
+    url = "https://local-business-data.p.rapidapi.com/search"
+    # Ensure the query is specific to hospitals in the specified city
+    query = f"{business_name} {business_type} {city}" if business_type else f"{business_name} {city}"
+    querystring = {
+        "query": query,
+        "limit": "1",
+        "language": "en"
+    }
+    headers = {
+        "X-RapidAPI-Key": RAPIDAPI_KEY,
+        "X-RapidAPI-Host": "local-business-data.p.rapidapi.com"
+    }
+    
+    try:
+        data = get_json("rapidapi_search", "rapidapi", url, params=querystring, headers=headers, timeout=5)
+        
+        logging.info(f"Local Business Data API search response for {business_name} in {city}: {data}")
+        
+        if not data.get("data") or not isinstance(data["data"], list):
+            logging.warning(f"No valid data returned from Local Business Data API for {business_name} in {city}")
+            return None, "N/A", "N/A", "N/A", "N/A"
+        
+        if not data["data"]:
+            logging.warning(f"Empty data list returned from Local Business Data API for {business_name} in {city}")
+            return None, "N/A", "N/A", "N/A", "N/A"
+        
+        business = data["data"][0]
+        if not isinstance(business, dict):
+            logging.warning(f"Invalid business entry (not a dictionary) for {business_name} in {city}: {business}")
+            return None, "N/A", "N/A", "N/A", "N/A"
+        
+        # Verify that the result is a hospital in the specified city
+        name = business.get("name", "").lower()
+        address = business.get("address", "").lower()
+        if business_type == "hospitals" and "hospital" not in name and "hospital" not in address:
+            logging.warning(f"Business {name} does not appear to be a hospital: {business}")
+            return None, "N/A", "N/A", "N/A", "N/A"
+        if city.lower() not in address:
+            logging.warning(f"Business {name} is not in {city}: {address}")
+            return None, "N/A", "N/A", "N/A", "N/A"
+        
+        business_id = business.get("business_id")
+        phone = business.get("phone_number", "N/A")
+        email = business.get("email", "N/A")
+        opening_hours = business.get("business_hours", "N/A")
+        if opening_hours != "N/A" and isinstance(opening_hours, dict):
+            hours_str = []
+            for day, times in opening_hours.items():
+                hours_str.append(f"{day}: {times}")
+            opening_hours = "; ".join(hours_str)
+        website = business.get("website", "N/A")
+        
+        phone = validate_phone_number(phone, phones.region_for(city))
+        return business_id, phone, email, opening_hours, website
+    
+    except requests.RequestException as e:
+        _record_failure(failures, "local_search")
+        if is_rate_limited(e):
+            notify("error", "API quota exceeded. Please wait for the quota to reset or upgrade to a paid plan on RapidAPI.")
+            return None, None, None, None, None
+        logging.error(f"Error searching Local Business Data API for {business_name} in {city}: {str(e)}")
+        return None, "N/A", "N/A", "N/A", "N/A"
+
+# Fetch business details using Local Business Data API
+def fetch_local_business_details(business_id, region=None, failures=None):
+    if not business_id:
+        return "N/A", "N/A", "N/A", "N/A"
+    
+    url = "https://local-business-data.p.rapidapi.com/business-details"
+    querystring = {
+        "business_id": business_id,
+        "extract_emails_and_contacts": "true",
+        "extract_share_link": "false",
+        "language": "en"
+    }
+    headers = {
+        "X-RapidAPI-Key": RAPIDAPI_KEY,
+        "X-RapidAPI-Host": "local-business-data.p.rapidapi.com"
+    }
+    
+    try:
+        data = get_json("rapidapi_details", "rapidapi", url, params=querystring, headers=headers, timeout=5)
+        
+        logging.info(f"Local Business Data API response for business_id {business_id}: {data}")
+        
+        if not data.get("data"):
+            logging.warning(f"No business details found for business_id {business_id}")
+            return "N/A", "N/A", "N/A", "N/A"
+        
+        business = data["data"]
+        if not isinstance(business, dict):
+            logging.warning(f"Invalid business details (not a dictionary) for business_id {business_id}: {business}")
+            return "N/A", "N/A", "N/A", "N/A"
+        
+        phone = business.get("phone_number", "N/A")
+        email = business.get("email", "N/A")
+        opening_hours = business.get("business_hours", "N/A")
+        if opening_hours != "N/A" and isinstance(opening_hours, dict):
+            hours_str = []
+            for day, times in opening_hours.items():
+                hours_str.append(f"{day}: {times}")
+            opening_hours = "; ".join(hours_str)
+        website = business.get("website", "N/A")
+        
+        phone = validate_phone_number(phone, region)
+        return phone, email, opening_hours, website
+    
+    except requests.RequestException as e:
+        _record_failure(failures, "local_details")
+        if is_rate_limited(e):
+            notify("error", "API quota exceeded. Please wait for the quota to reset or upgrade to a paid plan on RapidAPI.")
+            return "N/A", "N/A", "N/A", "N/A"
+        logging.error(f"Error fetching Local Business Data API details for business_id {business_id}: {str(e)}")
+        return "N/A", "N/A", "N/A", "N/A"
+
+# Only cache Google Places answers that are not quota or key errors
+def google_cacheable(data):
+    return data.get("status") in ("OK", "ZERO_RESULTS")
+
+# Fetch reviews using Google Places API (optional, requires GOOGLE_API_KEY)
+def fetch_google_reviews(business_name, city, failures=None):
+    if not GOOGLE_API_KEY:
+        logging.info("Google API key not found. Skipping reviews.")
+        return "N/A"
+
+    search_url = "https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
+    search_params = {
+        "input": f"{business_name} {city}",
+        "inputtype": "textquery",
+        "fields": "place_id",
+        "key": GOOGLE_API_KEY
+    }
+
+    try:
+        search_data = get_json("google_search", "google", search_url, params=search_params, timeout=5, cacheable=google_cacheable)
+
+        logging.info(f"Google Places search response for {business_name} in {city}: {search_data}")
+
+        if search_data.get("status") != "OK" or not search_data.get("candidates"):
+            logging.warning(f"No place found for {business_name} in {city} using Google Places API")
+            return "N/A"
+
+        place_id = search_data["candidates"][0]["place_id"]
+
+        details_url = "https://maps.googleapis.com/maps/api/place/details/json"
+        details_params = {
+            "place_id": place_id,
+            "fields": "reviews",
+            "key": GOOGLE_API_KEY
+        }
+
+        details_data = get_json("google_details", "google", details_url, params=details_params, timeout=5, cacheable=google_cacheable)
+
+        logging.info(f"Google Places details response for place_id {place_id}: {details_data}")
+
+        if details_data.get("status") != "OK" or not details_data.get("result"):
+            logging.warning(f"No details found for place_id {place_id} using Google Places API")
+            return "N/A"
+
+        reviews = details_data["result"].get("reviews", [])
+        if not reviews:
+            return "No reviews available"
+
+        review_texts = []
+        for review in reviews[:3]:
+            author = review.get("author_name", "Anonymous")
+            rating = review.get("rating", "N/A")
+            text = review.get("text", "No comment")
+            review_texts.append(f"{author} (Rating: {rating}/5): {text}")
+        
+        return "; ".join(review_texts)
+
+    except requests.RequestException as e:
+        _record_failure(failures, "reviews")
+        logging.error(f"Error fetching Google Places data for {business_name} in {city}: {str(e)}")
+        return "N/A"
+
+# Scrape email, phone, and opening hours from a website, following its contact/about pages.
+# The crawl stops once the fields in `need` ("email", "phone", "hours") are found.
+def scrape_website(website_url, need=("email", "phone", "hours"), region=None, failures=None):
+    if not website_url or website_url == "N/A":
+        return "N/A", "N/A", "N/A"
+    
+    try:
+        import contact_crawler  # imported lazily to keep start-up fast
+        found = contact_crawler.crawl(website_url, get_http_session(), need)
+        email, phone, opening_hours = found["email"], found["phone"], found["hours"]
+        return email or "N/A", validate_phone_number(phone, region) if phone else "N/A", opening_hours or "N/A"
+    
+    except requests.RequestException as e:
+        _record_failure(failures, "website")
+        logging.error(f"Error scraping website {website_url}: {str(e)}")
+        return "N/A", "N/A", "N/A"
+    # A page the parsers choke on must not fail the whole search; retrying would not help either
+    except Exception as e:
+        logging.error(f"Error extracting contacts from website {website_url}: {e!r}")
+        return "N/A", "N/A", "N/A"
+
+# Strict filtering to ensure an Overpass element is the requested business type
+def matches_business_type(element, business_type):
+    tags = element.get('tags', {})
+    name = tags.get('name', 'Unknown').lower()
+    actual_type = tags.get('amenity', '').lower()
+    expected_type = OSM_AMENITIES.get(business_type)
+    if expected_type and actual_type != expected_type:
+        logging.info(f"Skipping {name} - not a {expected_type} (amenity: {actual_type})")
+        return False
+    
+    # Additional check to ensure the business is a hospital based on name
+    if business_type == "hospitals" and "hospital" not in name:
+        logging.info(f"Skipping {name} - name does not contain 'hospital'")
+        return False
+    return True
+
+# Enrich a single Overpass element with phone, email, hours, website and reviews.
+# Returns the BusinessRecord (None if filtered out) and the seconds spent per stage.
+def enrich_business(element, business_type, city):
+    timings = {}
+    started = time.perf_counter()
+    if not isinstance(element, dict):
+        logging.warning(f"Skipping invalid element (not a dictionary): {element}")
+        return None, timings
+    
+    tags = element.get('tags', {})
+    logging.info(f"Raw OSM tags for {tags.get('name', 'Unknown')}: {tags}")
+    
+    name = tags.get('name', 'Unknown').lower()
+    # Ways and relations only carry a computed center (out center)
+    lat = element.get('lat', element.get('center', {}).get('lat', 'N/A'))
+    lon = element.get('lon', element.get('center', {}).get('lon', 'N/A'))
+    phone = tags.get('phone', 'N/A')
+    email = tags.get('email', 'N/A')
+    opening_hours = tags.get('opening_hours', 'N/A')
+    website = tags.get('website', 'N/A')
+    
+    if not matches_business_type(element, business_type):
+        return None, timings
+    region = phones.region_for(city)
+    business_id = None
+    failures = []
+    
+    # Use Local Business Data API to fetch phone, email, opening hours, and website
+    if phone == "N/A" or email == "N/A" or opening_hours == "N/A" or website == "N/A":
+        stage_start = time.perf_counter()
+        business_id, local_phone, local_email, local_hours, local_website = search_local_business(name, business_type, city, failures)
+        if business_id is None:
+            notify("warning", f"Could not find {name} in {city} using the Local Business Data API. Trying a simpler query...")
+            business_id, local_phone, local_email, local_hours, local_website = search_local_business(name, "", city, failures)
+        
+        phone = local_phone if phone == "N/A" and local_phone != "N/A" else phone
+        email = local_email if email == "N/A" and local_email != "N/A" else email
+        opening_hours = local_hours if opening_hours == "N/A" and local_hours != "N/A" else opening_hours
+        website = local_website if website == "N/A" and local_website != "N/A" else website
+        timings["local_search"] = time.perf_counter() - stage_start
+        
+        if (phone == "N/A" or email == "N/A" or opening_hours == "N/A" or website == "N/A") and business_id:
+            stage_start = time.perf_counter()
+            local_phone, local_email, local_hours, local_website = fetch_local_business_details(business_id, region, failures)
+            phone = local_phone if phone == "N/A" and local_phone != "N/A" else phone
+            email = local_email if email == "N/A" and local_email != "N/A" else email
+            opening_hours = local_hours if opening_hours == "N/A" and local_hours != "N/A" else opening_hours
+            website = local_website if website == "N/A" and local_website != "N/A" else website
+            timings["local_details"] = time.perf_counter() - stage_start
+        else:
+            notify("warning", f"No additional data found for {name} in {city} using the Local Business Data API. Falling back to website scraping or assumed hours.")
+    
+    if (email == "N/A" or phone == "N/A" or opening_hours == "N/A") and website != "N/A":
+        stage_start = time.perf_counter()
+        need = [field for field, value in (("email", email), ("phone", phone), ("hours", opening_hours)) if value == "N/A"]
+        scraped_email, scraped_phone, scraped_hours = scrape_website(website, need, region, failures)
+        timings["website"] = time.perf_counter() - stage_start
+        email = scraped_email if email == "N/A" and scraped_email != "N/A" else email
+        phone = scraped_phone if phone == "N/A" and scraped_phone != "N/A" else phone
+        opening_hours = scraped_hours if opening_hours == "N/A" and scraped_hours != "N/A" else opening_hours
+    
+    stage_start = time.perf_counter()
+    reviews_comments = fetch_google_reviews(name, city, failures)
+    timings["reviews"] = time.perf_counter() - stage_start
+    timings["total"] = time.perf_counter() - started
+    
+    # The "N/A" placeholders used above become real nulls in the record
+    business = BusinessRecord.from_dict({
+        'name': name,
+        'latitude': lat,
+        'longitude': lon,
+        'phone': phone,
+        'email': email,
+        'opening_hours': opening_hours,
+        'website': website,
+        'reviews_comments': reviews_comments
+    })
+    if failures:
+        logging.info(f"Incomplete enrichment for {name}, failed: {', '.join(failures)}")
+    if entities.ENTITY_RESOLUTION:
+        source_keys = [osm_source_key(element)] + ([("rapidapi", business_id)] if business_id else [])
+        try:
+            # Only a complete enrichment is reused; after an upstream failure the next search tries again
+            entities.index.add(business, source_keys, enriched=not failures, kind=osm_kind(element))
+        except sqlite3.Error as e:
+            logging.error(f"Entity index write failed for {name}: {e}")
+    return with_assumed_hours(business, business_type), timings
+
+# Typical opening hours shown when no source had any
+ASSUMED_HOURS = {
+    "hospitals": "9:00 AM - 5:00 PM (assumed, please verify)",
+    "restaurants": "11:00 AM - 11:00 PM (assumed, please verify)",
+}
+
+# Fill in assumed hours for display only; they are never stored in the entity index,
+# where they would shadow real hours found later
+def with_assumed_hours(business, business_type):
+    if business.opening_hours is None and business_type in ASSUMED_HOURS:
+        return replace(business, opening_hours=ASSUMED_HOURS[business_type])
+    return business
+
+# Entity-resolution key of an OSM element, e.g. ("osm", "node/123")
+def osm_source_key(element):
+    return "osm", f"{element.get('type', 'node')}/{element.get('id')}"
+
+# What an OSM element is (its amenity, e.g. "hospital"); entities of another kind are never reused for it
+def osm_kind(element):
+    return element.get('tags', {}).get('amenity')
+
+# What an OSM element says about a business before enrichment, for entity resolution
+def osm_record(element):
+    tags = element.get('tags', {})
+    return BusinessRecord.from_dict({
+        'name': tags.get('name'),
+        'latitude': element.get('lat', element.get('center', {}).get('lat')),
+        'longitude': element.get('lon', element.get('center', {}).get('lon')),
+        'phone': tags.get('phone'),
+        'website': tags.get('website'),
+    })
+
+# OSM amenity value for each supported business type
+OSM_AMENITIES = {
+    "schools": "school",
+    "restaurants": "restaurant",
+    "hospitals": "hospital"
+}
+
+# Approximate tile edge in degrees (~11 km) and the cap on tiles per bbox side
+OVERPASS_TILE_DEGREES = 0.1
+OVERPASS_MAX_TILES_PER_SIDE = 4
+
+# Case-insensitive name patterns applied at the source (same check as matches_business_type)
+OSM_NAME_PATTERNS = {
+    "hospitals": "hospital"
+}
+
+# Overpass selector for a business type; nwr also picks up amenities mapped as buildings (ways/relations)
+def overpass_selector(business_type):
+    amenity = OSM_AMENITIES.get(business_type)
+    if not amenity:
+        return 'nwr["amenity"]'
+    selector = f'nwr["amenity"="{amenity}"]'
+    if business_type in OSM_NAME_PATTERNS:
+        selector += f'["name"~"{OSM_NAME_PATTERNS[business_type]}",i]'
+    return selector
+
+# Fetch up to `limit` elements of a business type inside one bbox tile from the configured backend
+def fetch_osm_tile(tile, business_type, limit, backend=None):
+    if (backend or OSM_BACKEND) == "local":
+        return osm_extract.index.query(tile, OSM_AMENITIES.get(business_type), OSM_NAME_PATTERNS.get(business_type), limit)
+    
+    overpass_url = "http://overpass-api.de/api/interpreter"
+    # Default (asc) output order: nodes, ways, relations by id, the order osm_extract uses too
+    query = f"""
+    [out:json][timeout:25];
+    {overpass_selector(business_type)}({tile});
+    out center {limit};
+    """
+    data = get_json("overpass", "overpass", overpass_url, params={'data': query}, timeout=30,
+                    cacheable=lambda data: isinstance(data.get('elements'), list))
+    if 'elements' not in data or not isinstance(data['elements'], list):
+        logging.error("Overpass API response does not contain 'elements' or 'elements' is not a list")
+        return []
+    return data['elements']
+
+# Split a "south,west,north,east" bbox into a grid of tiles ordered by distance from the center
+def split_bbox(bbox, center):
+    south, west, north, east = map(float, bbox.split(","))
+    rows = min(OVERPASS_MAX_TILES_PER_SIDE, max(1, round((north - south) / OVERPASS_TILE_DEGREES)))
+    cols = min(OVERPASS_MAX_TILES_PER_SIDE, max(1, round((east - west) / OVERPASS_TILE_DEGREES)))
+    lat_step = (north - south) / rows
+    lon_step = (east - west) / cols
+    tiles = []
+    for row in range(rows):
+        for col in range(cols):
+            tile_south = south + row * lat_step
+            tile_west = west + col * lon_step
+            distance = (tile_south + lat_step / 2 - center[0]) ** 2 + (tile_west + lon_step / 2 - center[1]) ** 2
+            tiles.append((distance, f"{tile_south:.6f},{tile_west:.6f},{tile_south + lat_step:.6f},{tile_west + lon_step:.6f}"))
+    return [tile for _, tile in sorted(tiles)]
+
+# Resolve the city and download candidate elements from the OpenStreetMap Overpass API.
+# Returns (elements, business_type, city, center, timings); center is None if the city is unknown.
+def fetch_osm_elements(search_term, num_to_fetch):
+    timings = {}
+    terms = search_term.lower().split()
+    if len(terms) < 2:
+        return [], None, None, None, timings
+    city = terms[0]  # e.g., "sukkur"
+    business_type = terms[-1]  # e.g., "hospitals"
+    
+    stage_start = time.perf_counter()
+    bbox, center = get_city_bbox(city)
+    timings["geocode"] = time.perf_counter() - stage_start
+    if not bbox or not center:
+        return [], business_type, city, None, timings
+    
+    # Query tiles from the city center outwards and stop once enough businesses match
+    per_tile_limit = max(num_to_fetch * 2, 10)
+    elements = []
+    seen = set()
+    # The same business mapped twice (e.g. a node and a building way) is only kept once
+    resolver = entities.Resolver()
+    duplicates = 0
+    tiles = split_bbox(bbox, center)
+    queried = 0
+    stage_start = time.perf_counter()
+    backend = OSM_BACKEND
+    if backend == "local" and not osm_extract.index.exists():
+        notify("warning", f"OSM_BACKEND=local but there is no POI index at {osm_extract.index.path} "
+                          "(build it with: python osm_extract.py build <extract.osm.pbf>). Using the Overpass API instead.")
+        backend = "overpass"
+    for tile in tiles:
+        try:
+            tile_elements = fetch_osm_tile(tile, business_type, per_tile_limit, backend)
+        except (requests.RequestException, sqlite3.Error) as e:
+            logging.error(f"Error fetching OSM data for tile {tile}: {str(e)}")
+            continue
+        queried += 1
+        
+        for element in tile_elements:
+            if not isinstance(element, dict):
+                continue
+            key = (element.get('type'), element.get('id'))
+            if key in seen or not matches_business_type(element, business_type):
+                continue
+            seen.add(key)
+            index = resolver.add(entities.Entry(osm_record(element), [osm_source_key(element)], kind=osm_kind(element)))
+            if resolver.group(index) != index:
+                duplicates += 1
+                continue
+            elements.append(element)
+        if len(elements) >= num_to_fetch:
+            break
+    timings["osm"] = time.perf_counter() - stage_start
+    logging.info(f"OSM ({backend}): {len(elements)} matching elements from {queried} of {len(tiles)} tiles"
+                 f" ({duplicates} duplicates dropped)")
+    
+    return elements[:num_to_fetch], business_type, city, center, timings
+
+# Key under which an enriched element is remembered across searches
+def enrichment_key(element, business_type):
+    return f"{business_type}:{element.get('type', 'node')}/{element.get('id')}"
+
+# Enrich elements in parallel and yield (index, business, timings) as each one finishes.
+# The shared rate limiter still paces each upstream; index is the element's original position.
+# enriched_cache is an optional mapping (e.g. batch.EnrichedStore) used to skip businesses
+# that were already enriched by an earlier search; the entity index skips those that
+# resolve to a recently enriched business.
+def iter_enriched_businesses(elements, business_type, city, enriched_cache=None):
+    executor = ThreadPoolExecutor(max_workers=ENRICH_WORKERS)
+    try:
+        cached = []
+        futures = {}
+        # Entities already shown in this search; a second element resolving to one is a duplicate row
+        emitted = set()
+        for index, element in enumerate(elements):
+            key = enrichment_key(element, business_type)
+            business = enriched_cache.get(key) if enriched_cache is not None else None
+            if business is None and entities.ENTITY_RESOLUTION:
+                # Already enriched through another element or source (e.g. a Google Maps listing)
+                found = entities.index.resolved(osm_record(element), [osm_source_key(element)], kind=osm_kind(element))
+                if found is not None:
+                    entity_id, business = found
+                    if entity_id in emitted:
+                        logging.info(f"Skipping {osm_record(element).name}: same business as an earlier row")
+                        cached.append((index, None))
+                        continue
+                    emitted.add(entity_id)
+                    business = with_assumed_hours(business, business_type)
+            if business is not None:
+                cached.append((index, business))
+            else:
+                context = contextvars.copy_context()
+                futures[executor.submit(context.run, enrich_business, element, business_type, city)] = (index, key)
+        for index, business in cached:
+            yield index, business, {}
+        for future in as_completed(futures):
+            business, timings = future.result()
+            index, key = futures[future]
+            if enriched_cache is not None and business is not None:
+                enriched_cache[key] = business
+            yield index, business, timings
+    finally:
+        # Stop queued work if the consumer goes away early
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Fetch business data using OpenStreetMap Overpass API for a specific city
+def fetch_osm_businesses(search_term, num_to_fetch, enriched_cache=None):
+    elements, business_type, city, center, _ = fetch_osm_elements(search_term, num_to_fetch)
+    if center is None:
+        return [], None
+    enriched = iter_enriched_businesses(elements, business_type, city, enriched_cache)
+    results = sorted(((index, business) for index, business, _ in enriched if business is not None),
+                     key=lambda result: result[0])
+    return [business for _, business in results], center
+
+# Columns written by the exporters, in display order
+EXPORT_COLUMNS = list(OSM_COLUMNS)
+
+# Write businesses to .csv or .jsonl (stdlib only), .parquet (needs pyarrow) or .xlsx (needs pandas/openpyxl)
+def export_businesses(businesses, path):
+    import exporters  # imported lazily to keep start-up fast
+    if os.path.exists(path):
+        os.remove(path)  # the exporters append
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        pq.write_table(RecordColumns(businesses, EXPORT_COLUMNS).to_arrow(), path)
+    elif path.endswith(".xlsx"):
+        RecordColumns(businesses, EXPORT_COLUMNS).to_dataframe().to_excel(path, index=False)
+    elif path.endswith(".jsonl"):
+        exporters.append_jsonl((business.to_dict(EXPORT_COLUMNS) for business in businesses), path)
+    else:
+        exporters.append_csv((business.to_dict(EXPORT_COLUMNS) for business in businesses), path, columns=EXPORT_COLUMNS)
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m scraper_core",
+                                     description="Fetch and enrich businesses for '<city> <business type>' without the web UI")
+    parser.add_argument("search_term", nargs="?", help="e.g. 'karachi hospitals'")
+    parser.add_argument("-n", "--num-to-fetch", type=int, default=5)
+    parser.add_argument("-o", "--output", help="write results to a .csv, .jsonl, .parquet or .xlsx file instead of stdout")
+    parser.add_argument("--region", help="phone region for numbers without a country code (default: from the city)")
+    parser.add_argument("--startup-time", action="store_true", help="report how long importing the core took and exit")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.startup_time:
+        status = "OK" if IMPORT_SECONDS <= COLD_START_TARGET_SECONDS else "OVER TARGET"
+        print(f"import scraper_core: {IMPORT_SECONDS * 1000:.0f} ms (target {COLD_START_TARGET_SECONDS * 1000:.0f} ms) {status}")
+        return 0 if status == "OK" else 1
+    if not args.search_term:
+        parser.error("search_term is required")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    pages_before = http_cache.pages.stats()
+    with phones.use_region(args.region):
+        businesses, center = fetch_osm_businesses(args.search_term, args.num_to_fetch)
+    if center is None:
+        print(f"City not found for '{args.search_term}'", file=sys.stderr)
+        return 1
+    if args.output:
+        export_businesses(businesses, args.output)
+        print(f"Wrote {len(businesses)} businesses to {args.output}", file=sys.stderr)
+    else:
+        writer = csv.DictWriter(sys.stdout, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(business.to_dict(EXPORT_COLUMNS) for business in businesses)
+    page_stats = http_cache.pages.stats(since=pages_before)
+    if page_stats["requests"]:
+        print(f"Website cache: {page_stats['hits']}/{page_stats['requests']} pages unchanged "
+              f"({page_stats['hit_rate']:.0%}), {page_stats['bytes_saved']} bytes saved", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
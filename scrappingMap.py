@@ -1,22 +1,40 @@
 """This script serves as an example on how to use Python
-   & Playwright to scrape/extract data from Google Maps"""
+   & Playwright to scrape/extract data from Google Maps
 
-from playwright.sync_api import sync_playwright
-from dataclasses import dataclass, asdict, field
+   The scraping engine is asyncio based: several searches can share one
+   browser in a single event loop (see scrape_many). scrape() is a
+   blocking wrapper for callers without an event loop; it reuses a warm
+   BrowserPool, so Chromium is launched once per process, not per call.
+"""
+
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from contextlib import contextmanager, asynccontextmanager
+from dataclasses import dataclass, field, replace
 import pandas as pd
+import asyncio
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
 import time
 from datetime import datetime
 
+import entities
+import exporters
+from records import BusinessRecord, RecordColumns, MAPS_COLUMNS, arrow_schema
+from storage import DATA_DIR
 
-@dataclass
-class Business:
-    """holds business data"""
-    name: str = None
-    address: str = None
-    website: str = None
-    phone_number: str = None
-    reviews_count: int = None
-    reviews_average: float = None
+
+CHECKPOINT_PATH = os.getenv("MAPS_CHECKPOINT_DB", os.path.join(DATA_DIR, "maps_checkpoint.db"))
+
+# csv, jsonl and parquet are appended to while scraping; xlsx is converted once at the end
+OUTPUT_FORMATS = tuple(f.strip() for f in os.getenv("MAPS_OUTPUT_FORMATS", "csv,xlsx").split(",") if f.strip())
+
+
+# Shared with the OpenStreetMap pipeline; this scraper fills the MAPS_COLUMNS fields
+Business = BusinessRecord
 
 
 @dataclass
@@ -31,8 +49,7 @@ class BusinessList:
 
         Returns: pandas dataframe
         """
-        data = list(asdict(business) for business in self.business_list)
-        return pd.json_normalize(data, sep="_")
+        return RecordColumns(self.business_list, MAPS_COLUMNS).to_dataframe()
 
     def save_to_excel(self, filename, append=False):
         """saves pandas dataframe to excel (xlsx) file"""
@@ -41,13 +58,16 @@ class BusinessList:
                 print("No data to save to Excel.")
                 return
             df = self.dataframe()
-            if append:
-                try:
-                    existing_df = pd.read_excel(f"{filename}.xlsx")
-                    df = pd.concat([existing_df, df], ignore_index=True)
-                except FileNotFoundError:
-                    pass
-            df.to_excel(f"{filename}.xlsx", index=False)
+            if append and os.path.exists(f"{filename}.xlsx"):
+                # Add rows to the existing sheet instead of parsing it into a DataFrame and concatenating
+                from openpyxl import load_workbook
+                workbook = load_workbook(f"{filename}.xlsx")
+                sheet = workbook.active
+                for row in df.itertuples(index=False):
+                    sheet.append([None if pd.isna(value) else value for value in row])
+                workbook.save(f"{filename}.xlsx")
+            else:
+                df.to_excel(f"{filename}.xlsx", index=False)
             print(f"Successfully saved to {filename}.xlsx")
         except Exception as e:
             print(f"Error saving to Excel: {e}")
@@ -60,178 +80,890 @@ class BusinessList:
                 return
             df = self.dataframe()
             mode = 'a' if append else 'w'
-            header = not append
+            header = not append or not os.path.exists(f"{filename}.csv")
             df.to_csv(f"{filename}.csv", mode=mode, header=header, index=False)
             print(f"Successfully saved to {filename}.csv")
         except Exception as e:
             print(f"Error saving to CSV: {e}")
 
+    def save_to_jsonl(self, filename, append=False):
+        """saves businesses to a JSON Lines file, one object per line"""
+        try:
+            if not self.business_list:
+                print("No data to save to JSONL.")
+                return
+            if not append and os.path.exists(f"{filename}.jsonl"):
+                os.remove(f"{filename}.jsonl")
+            exporters.append_jsonl((business.to_dict(MAPS_COLUMNS) for business in self.business_list), f"{filename}.jsonl")
+            print(f"Successfully saved to {filename}.jsonl")
+        except Exception as e:
+            print(f"Error saving to JSONL: {e}")
+
+    def save_to_parquet(self, filename):
+        """saves businesses to a Parquet file (needs pyarrow)"""
+        try:
+            if not self.business_list:
+                print("No data to save to Parquet.")
+                return
+            self.dataframe().to_parquet(f"{filename}.parquet", index=False)
+            print(f"Successfully saved to {filename}.parquet")
+        except Exception as e:
+            print(f"Error saving to Parquet: {e}")
 
-def load_listings(page, search_for, listing_xpath, max_listings=20):
-    """Loads the list of businesses by navigating to the search URL and scrolling"""
+
+class ScrapeCheckpoint:
+    """per-place progress of a search, keyed by place URL, so a crashed scrape can resume
+
+    One run is kept per search term, with the output file its rows are being
+    appended to.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = path
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE IF NOT EXISTS runs (search TEXT PRIMARY KEY, output_filename TEXT, started_at TEXT)")
+        conn.execute('''CREATE TABLE IF NOT EXISTS places (
+            search TEXT, url TEXT, position INTEGER, status TEXT, business TEXT, scraped_at TEXT,
+            PRIMARY KEY (search, url))''')
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def key(search_for):
+        return " ".join(search_for.lower().split())
+
+    def start(self, search_for, output_filename, resume=False):
+        """returns (output_filename, urls already done); a fresh start forgets earlier progress"""
+        search = self.key(search_for)
+        conn = sqlite3.connect(self.path)
+        row = conn.execute("SELECT output_filename FROM runs WHERE search = ?", (search,)).fetchone()
+        if resume and row:
+            done = {url for (url,) in conn.execute("SELECT url FROM places WHERE search = ? AND status = 'done'", (search,))}
+            conn.close()
+            print(f"Resuming '{search_for}': {len(done)} places already scraped into {row[0]}")
+            return row[0], done
+        conn.execute("DELETE FROM places WHERE search = ?", (search,))
+        conn.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?)",
+                     (search, output_filename, time.strftime("%Y-%m-%d %H:%M:%S")))
+        conn.commit()
+        conn.close()
+        return output_filename, set()
+
+    def record(self, search_for, url, position, business):
+        """marks a place done (with its Business) or failed (business is None, retried on resume)"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("INSERT OR REPLACE INTO places VALUES (?, ?, ?, ?, ?, ?)",
+                     (self.key(search_for), url, position, "done" if business else "failed",
+                      json.dumps(business.to_dict(), ensure_ascii=False) if business else None,
+                      time.strftime("%Y-%m-%d %H:%M:%S")))
+        conn.commit()
+        conn.close()
+
+    def business_list(self, search_for):
+        """every business scraped for the search so far, in feed order"""
+        conn = sqlite3.connect(self.path)
+        rows = conn.execute("SELECT business FROM places WHERE search = ? AND status = 'done' ORDER BY position",
+                            (self.key(search_for),)).fetchall()
+        conn.close()
+        return BusinessList([Business.from_dict(json.loads(business)) for (business,) in rows])
+
+
+class StepTimer:
+    """records how long each scraping step takes,
+    for adaptive timeouts and per-step latency histograms
+    """
+
+    # Histogram bucket upper bounds in milliseconds
+    BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000)
+
+    def record(self, name, milliseconds):
+        with self._lock:
+            self.samples.setdefault(name, []).append(milliseconds)
+
+    def timeout_for(self, name, default=15000, floor=2000, ceiling=60000):
+        """three times the step's observed p95 (once there are a few samples), clamped to [floor, ceiling] ms"""
+        with self._lock:
+            samples = sorted(self.samples.get(name, []))
+        if len(samples) < 5:
+            return default
+        p95 = samples[int(0.95 * (len(samples) - 1))]
+        return int(min(ceiling, max(floor, p95 * 3)))
+
+    def histogram(self, name):
+        """(bucket label, count) pairs for one step"""
+        with self._lock:
+            samples = list(self.samples.get(name, []))
+        counts = []
+        lower = 0
+        for upper in self.BUCKETS + (float("inf"),):
+            label = f"<{upper} ms" if upper != float("inf") else f">={lower} ms"
+            counts.append((label, sum(1 for sample in samples if lower <= sample < upper)))
+            lower = upper
+        return counts
+
+    def report(self):
+        """prints count, p50, p95 and max plus a histogram for every step"""
+        with self._lock:
+            names = sorted(self.samples)
+        for name in names:
+            samples = sorted(self.samples[name])
+            p50 = samples[len(samples) // 2]
+            p95 = samples[int(0.95 * (len(samples) - 1))]
+            print(f"{name}: n={len(samples)} p50={p50:.0f} ms p95={p95:.0f} ms max={samples[-1]:.0f} ms")
+            for label, count in self.histogram(name):
+                if count:
+                    print(f"    {label:>12} {'#' * count} {count}")
+
+
+# Shared by every page and search so timeouts adapt to what the pages actually need
+step_timer = StepTimer()
+
+# Google Maps selectors live in a versioned JSON table so they can be updated without code changes
+SELECTORS_PATH = os.getenv("MAPS_SELECTORS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "maps_selectors.json"))
+
+DEFAULT_SELECTOR_TABLE = {
+    "version": 0,
+    "selectors": {
+        "listing": '//a[contains(@href, "https://www.google.com/maps/place")]',
+        "name": "h1.DUwDvf",
+        "info_rows": "div.Io6YTe",
+        "website": 'a[href*="http"][class*="CsEnBe"]',
+        "reviews": "span.F7nice span[aria-label]",
+        "captcha": 'div[aria-label="CAPTCHA"]',
+        "end_of_list": "span.HlvSq",
+    },
+    "address_markers": ["Sukkur", "Pakistan"],
+    "phone_prefixes": ["+92"],
+}
+
+
+def load_selector_table(path=SELECTORS_PATH):
+    """Loads the selector table, falling back to the built-in defaults for anything missing"""
+    table = json.loads(json.dumps(DEFAULT_SELECTOR_TABLE))
+    try:
+        with open(path, encoding="utf-8") as f:
+            loaded = json.load(f)
+        table["selectors"].update(loaded.get("selectors", {}))
+        for key in ("version", "address_markers", "phone_prefixes"):
+            if key in loaded:
+                table[key] = loaded[key]
+    except FileNotFoundError:
+        print(f"Selector table {path} not found, using built-in selectors")
+    return table
+
+
+SELECTOR_TABLE = load_selector_table()
+SELECTORS = SELECTOR_TABLE["selectors"]
+CAPTCHA_SELECTOR = SELECTORS["captcha"]
+NAME_SELECTOR = SELECTORS["name"]
+END_OF_LIST_SELECTOR = SELECTORS["end_of_list"]
+
+# Pulls every Business field out of the place panel in a single round trip
+EXTRACT_JS = """(table) => {
+    const s = table.selectors;
+    const text = (el) => (el && el.innerText ? el.innerText.trim() : "");
+    const rows = Array.from(document.querySelectorAll(s.info_rows)).map(text);
+    const website = document.querySelector(s.website);
+    const reviews = document.querySelector(s.reviews);
+    return {
+        name: text(document.querySelector(s.name)),
+        address: rows.find(row => table.address_markers.some(marker => row.includes(marker))) || "",
+        website: website ? website.getAttribute("href") || "" : "",
+        phone_number: rows.find(row => table.phone_prefixes.some(prefix => row.startsWith(prefix))) || "",
+        reviews_label: reviews ? reviews.getAttribute("aria-label") || "" : "",
+        captcha: document.querySelector(s.captcha) !== null,
+    };
+}"""
+
+
+# True once more listings than `previous` match the feed XPath
+FEED_GREW_JS = """([xpath, previous]) => document.evaluate(
+    `count(${xpath})`, document, null, XPathResult.NUMBER_TYPE, null).numberValue > previous"""
+
+# hrefs of the listings after the first `offset` (all of them if the feed shrank), plus the feed size
+HARVEST_JS = """([xpath, offset]) => {
+    const snapshot = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    const hrefs = [];
+    for (let i = offset <= snapshot.snapshotLength ? offset : 0; i < snapshot.snapshotLength; i++) {
+        hrefs.push(snapshot.snapshotItem(i).href);
+    }
+    return {total: snapshot.snapshotLength, hrefs};
+}"""
+
+# True once the place header shows a name. page.goto() is a full navigation, so the header
+# always belongs to the new document; chain branches that share a name still pass.
+HEADER_READY_JS = """selector => {
+    const header = document.querySelector(selector);
+    return header !== null && header.innerText.trim() !== "";
+}"""
+
+# Request interception: what a scrape never reads is aborted before it is downloaded
+BLOCKING_ENABLED = os.getenv("MAPS_BLOCKING", "1") != "0"
+BLOCKED_RESOURCE_TYPES = {t.strip() for t in os.getenv("MAPS_BLOCK_RESOURCES", "image,media,font").split(",") if t.strip()}
+# Map tiles are fetched as images, xhr or fetch depending on the renderer, so they are matched by URL
+TILE_PATTERNS = ("/maps/vt", "/maps/rpc/vt", "/kh/v=", "khms", "streetviewpixels", "/maps/preview/tiles")
+DEFAULT_DENY_PATTERNS = ("/gen_204", "/log?", "play.google.com/log", "/csi?", "google-analytics.com", "googletagmanager.com")
+# URL substrings that are always let through / always aborted (checked in that order)
+ALLOW_PATTERNS = tuple(p for p in os.getenv("MAPS_BLOCK_ALLOW", "").split(",") if p)
+DENY_PATTERNS = DEFAULT_DENY_PATTERNS + tuple(p for p in os.getenv("MAPS_BLOCK_DENY", "").split(",") if p)
+
+# Rough transfer size per blocked request, to estimate the bytes saved
+TYPICAL_BYTES = {"image": 25000, "media": 250000, "font": 40000, "tile": 30000, "denied": 1000}
+
+
+class ResourceBlocker:
+    """aborts images, media, fonts, map tiles and denied URLs on the pages it is attached to,
+    counting what was blocked and what was let through
+    """
+
+    def __init__(self, resource_types=BLOCKED_RESOURCE_TYPES, allow=ALLOW_PATTERNS, deny=DENY_PATTERNS, tiles=TILE_PATTERNS):
+        self.resource_types = set(resource_types)
+        self.allow = tuple(allow)
+        self.deny = tuple(deny)
+        self.tiles = tuple(tiles)
+        self.blocked = {}
+        self.allowed = 0
+        self.bytes_loaded = 0
+
+    def block_reason(self, url, resource_type):
+        """why a request should be aborted ("tile", "denied" or its resource type), or None to let it through"""
+        if any(pattern in url for pattern in self.allow):
+            return None
+        if any(pattern in url for pattern in self.deny):
+            return "denied"
+        if any(pattern in url for pattern in self.tiles):
+            return "tile"
+        if resource_type in self.resource_types:
+            return resource_type
+        return None
+
+    async def _handle(self, route):
+        request = route.request
+        reason = self.block_reason(request.url, request.resource_type)
+        if reason:
+            self.blocked[reason] = self.blocked.get(reason, 0) + 1
+            await route.abort("blockedbyclient")
+        else:
+            self.allowed += 1
+            await route.fallback()
+
+    def _on_response(self, response):
+        # Only responses that announce their size; chunked ones are not counted
+        length = response.headers.get("content-length")
+        if length and length.isdigit():
+            self.bytes_loaded += int(length)
+
+    async def install(self, target):
+        """starts intercepting on a page or a whole browser context"""
+        await target.route("**/*", self._handle)
+        target.on("response", self._on_response)
+
+    async def uninstall(self, target):
+        try:
+            target.remove_listener("response", self._on_response)
+            await target.unroute("**/*", self._handle)
+        except Exception:
+            pass  # the page is already closed
+
+    def wrap(self, open_page):
+        """page factory like `open_page` whose pages are intercepted by this blocker while checked out"""
+        @asynccontextmanager
+        async def blocked_page():
+            async with open_page() as page:
+                await self.install(page)
+                try:
+                    yield page
+                finally:
+                    await self.uninstall(page)
+        return blocked_page
+
+    def summary(self):
+        blocked = sum(self.blocked.values())
+        return {
+            "blocked": blocked,
+            "blocked_by_reason": dict(self.blocked),
+            "allowed": self.allowed,
+            "bytes_loaded": self.bytes_loaded,
+            "bytes_saved_estimate": sum(TYPICAL_BYTES.get(reason, TYPICAL_BYTES["image"]) * count
+                                        for reason, count in self.blocked.items()),
+        }
+
+    def report(self):
+        s = self.summary()
+        by_reason = ", ".join(f"{reason}={count}" for reason, count in sorted(s["blocked_by_reason"].items()))
+        print(f"Blocked {s['blocked']} of {s['blocked'] + s['allowed']} requests ({by_reason or 'none'}), "
+              f"~{s['bytes_saved_estimate'] / 1e6:.1f} MB saved, {s['bytes_loaded'] / 1e6:.1f} MB loaded")
+
+
+async def load_listings(page, search_for, listing_xpath, max_listings=20):
+    """Opens the search and scrolls the feed until max_listings unique places are known
+
+    Place URLs are harvested as each batch of listings appears, only looking at
+    listings past the ones already seen. Returns them in feed order.
+    """
     print(f"Loading listings for: {search_for}")
-    page.goto(f"https://www.google.com/maps/search/{search_for}", timeout=60000)
-    page.wait_for_timeout(5000)
+    with step_timer.step("search_page"):
+        await page.goto(f"https://www.google.com/maps/search/{search_for}", timeout=60000, wait_until="domcontentloaded")
+        # Ready as soon as the first listing is rendered (a CAPTCHA page never gets one)
+        try:
+            await page.wait_for_selector(listing_xpath, state="attached", timeout=30000)
+        except PlaywrightTimeoutError:
+            pass
 
-    captcha_selector = 'div[aria-label="CAPTCHA"]'
-    if page.query_selector(captcha_selector):
+    if await page.query_selector(CAPTCHA_SELECTOR):
         raise Exception("CAPTCHA detected. Please solve the CAPTCHA manually or consider using the Google Maps API.")
 
-    page.hover(listing_xpath)
-    previously_counted = 0
-    while True:
-        page.mouse.wheel(0, 10000)
-        page.wait_for_timeout(3000)
-
-        current_count = page.locator(listing_xpath).count()
-        if current_count >= max_listings:
-            print(f"Reached maximum listings to load: {max_listings}")
+    urls = {}  # insertion-ordered set
+    harvested = await page.evaluate(HARVEST_JS, [listing_xpath, 0])
+    urls.update(dict.fromkeys(href for href in harvested["hrefs"] if href))
+    previously_counted = harvested["total"]
+    if urls:
+        await page.hover(listing_xpath)
+    while urls and len(urls) < max_listings:
+        await page.mouse.wheel(0, 10000)
+        # Wait until the feed grows instead of sleeping a fixed 3 s
+        started = time.perf_counter()
+        try:
+            await page.wait_for_function(FEED_GREW_JS, arg=[listing_xpath, previously_counted],
+                                         timeout=step_timer.timeout_for("feed_scroll", default=8000, floor=1500, ceiling=15000))
+        except PlaywrightTimeoutError:
+            print(f"Arrived at all available listings: {len(urls)}")
             break
-        if current_count == previously_counted:
-            print(f"Arrived at all available listings: {current_count}")
+        # Only successful waits feed the adaptive timeout
+        step_timer.record("feed_scroll", (time.perf_counter() - started) * 1000)
+
+        harvested = await page.evaluate(HARVEST_JS, [listing_xpath, previously_counted])
+        urls.update(dict.fromkeys(href for href in harvested["hrefs"] if href))
+        previously_counted = harvested["total"]
+        print(f"Currently known places: {len(urls)}")
+        if await page.query_selector(END_OF_LIST_SELECTOR):
+            print(f"Reached the end of the list: {len(urls)}")
             break
-        previously_counted = current_count
-        print(f"Currently loaded: {previously_counted}")
+    else:
+        if urls:
+            print(f"Found enough places: {max_listings}")
+    return list(urls)[:max_listings]
+
+
+def apply_extracted_fields(business, fields):
+    """Copies the dict returned by EXTRACT_JS onto a Business, parsing the reviews label"""
+    # EXTRACT_JS returns "" for anything it did not find
+    business.name = fields["name"] or None
+    business.address = fields["address"] or None
+    business.website = fields["website"] or None
+    business.phone = fields["phone_number"] or None
+    business.reviews_average = None
+    business.reviews_count = None
+    # e.g. "4.3 stars 1,234 Reviews"
+    parts = fields["reviews_label"].split()
+    if len(parts) >= 3:
+        try:
+            business.reviews_average = float(parts[0].replace(",", ".").strip())
+            business.reviews_count = int(parts[2].replace(",", "").strip())
+        except ValueError:
+            pass
+    return business
+
+
+async def scrape_place(page, url, position=None):
+    """Opens a place URL directly and extracts its Business, or returns None if it fails"""
+    label = position if position is not None else url
+    business = Business()
+    try:
+        with step_timer.step("place_navigation"):
+            await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+
+        # Ready once the header shows this place's name, not after a fixed 5 s + 2 s
+        started = time.perf_counter()
+        try:
+            await page.wait_for_function(HEADER_READY_JS, arg=NAME_SELECTOR,
+                                         timeout=step_timer.timeout_for("place_ready"))
+            step_timer.record("place_ready", (time.perf_counter() - started) * 1000)
+        except PlaywrightTimeoutError:
+            if await page.query_selector(CAPTCHA_SELECTOR):
+                raise Exception("CAPTCHA detected. Please solve the CAPTCHA manually or consider using the Google Maps API.")
+            print(f"Could not load detailed page for business {label}")
+            return None
 
+        # The details panel (address, phone) can render just after the header
+        started = time.perf_counter()
+        try:
+            await page.wait_for_selector(SELECTORS["info_rows"], state="attached", timeout=step_timer.timeout_for("details_panel", default=5000, floor=1000))
+            step_timer.record("details_panel", (time.perf_counter() - started) * 1000)
+        except PlaywrightTimeoutError:
+            pass
+
+        with step_timer.step("extract"):
+            fields = await page.evaluate(EXTRACT_JS, SELECTOR_TABLE)
+        if fields["captcha"]:
+            raise Exception("CAPTCHA detected. Please solve the CAPTCHA manually or consider using the Google Maps API.")
+        apply_extracted_fields(business, fields)
+        print(f"Extracted {business.name}: address={business.address!r} phone={business.phone!r} "
+              f"website={business.website!r} reviews={business.reviews_count} avg={business.reviews_average}")
+
+    # CancelledError is not an Exception, so cancelling a search still stops it here
+    except Exception as e:
+        print(f"Error scraping business {label}: {e}")
+        return None
+
+    if not business.name:
+        print(f"Skipping business {label}: No name found")
+        return None
+    return business
+
+
+def _still_needed(urls, skip, target):
+    # Places left to scrape successfully; those scraped by an earlier run (skip) count too
+    if target is None:
+        return len(urls)
+    return max(0, target - sum(1 for url in urls if url in skip))
+
+
+async def scrape_businesses(page, urls, skip=(), on_result=None, target=None):
+    """Scrapes place URLs one after another on a single page, stopping once `target` places succeeded
+
+    URLs in `skip` are left out; on_result(position, url, business or None) is
+    awaited after every place. URLs past the target replace places that fail.
+    """
+    business_list = BusinessList()
+    needed = _still_needed(urls, skip, target)
+    for position, url in enumerate(urls, start=1):
+        if len(business_list.business_list) >= needed:
+            break
+        if url in skip:
+            continue
+        business = await scrape_place(page, url, position)
+        if on_result:
+            await on_result(position, url, business)
+        if business:
+            print(f"Scraped business {position}: {business.name}")
+            business_list.business_list.append(business)
+    print(f"Total scraped: {len(business_list.business_list)} of {len(urls)}")
+    return business_list
+
+
+@asynccontextmanager
+async def context_page(context):
+    """A fresh page in `context`, closed on exit"""
+    page = await context.new_page()
+    try:
+        yield page
+    finally:
+        await page.close()
+
+
+async def scrape_urls(open_page, urls, workers=4, skip=(), on_result=None, target=None):
+    """Scrapes place URLs with `workers` pages and merges them into one BusinessList in input order
+
+    open_page() returns an async context manager yielding a page, e.g.
+    BrowserPool.page or functools.partial(context_page, context). `skip`,
+    on_result and target work as in scrape_businesses.
+    """
+    # A shared queue keeps every page busy even when some places are slow
+    pending = asyncio.Queue()
+    for position, url in enumerate(urls):
+        if url not in skip:
+            pending.put_nowait((position, url))
+    results = [None] * len(urls)
+    needed = _still_needed(urls, skip, target)
+    workers = max(1, min(workers, pending.qsize(), needed))
+    counts = {"succeeded": 0, "in_flight": 0}
+
+    async def worker():
+        async with open_page() as page:
+            # A spare URL is only taken while the places in flight could still fall short of the target
+            while not pending.empty() and counts["succeeded"] + counts["in_flight"] < needed:
+                position, url = pending.get_nowait()
+                counts["in_flight"] += 1
+                try:
+                    results[position] = await scrape_place(page, url, position + 1)
+                finally:
+                    counts["in_flight"] -= 1
+                if results[position]:
+                    counts["succeeded"] += 1
+                if on_result:
+                    await on_result(position + 1, url, results[position])
+
+    if not pending.empty() and needed:
+        await asyncio.gather(*(worker() for _ in range(workers)))
 
-def scrape_businesses(page, listing_xpath, start_index, num_to_scrape):
-    """Scrapes a specified number of businesses starting from start_index"""
     business_list = BusinessList()
-    scraped_count = 0
-    total_scraped = 0
+    business_list.business_list.extend(business for business in results if business)
+    return business_list
 
-    listings = page.locator(listing_xpath).all()
-    print(f"Available listings: {len(listings)}")
 
-    while total_scraped < num_to_scrape:
-        if start_index + scraped_count >= len(listings):
-            print(f"No more listings to scrape. Total Scraped in this batch: {total_scraped}")
-            break
+# Warm browser pool size and how many scrapes a page serves before it is replaced
+POOL_SIZE = int(os.getenv("MAPS_POOL_SIZE", "2"))
+POOL_MAX_USES = int(os.getenv("MAPS_POOL_MAX_USES", "50"))
+
 
-        listing = listings[start_index + scraped_count]
-        business = Business()
+@dataclass
+class PooledPage:
+    """a warm page and the context it lives in"""
+    context: object
+    page: object
+    uses: int = 0
+    broken: bool = False
+
+
+class BrowserPool:
+    """long-lived Chromium handing out pages that already loaded the Maps home page
+
+    The browser runs on a private event loop thread, so one pool can be shared
+    by every thread of the process (e.g. returned from an st.cache_resource
+    function) through run() and submit(). Pages are replaced after max_uses
+    checkouts, when their renderer crashes, when a scrape using them fails,
+    or when the browser itself dies.
+    """
 
+    def __init__(self, size=POOL_SIZE, max_uses=POOL_MAX_USES, headless=True):
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self.headless = headless
+        self._lock = threading.Lock()
+        self._metrics = {"checkouts": 0, "in_use": 0, "created": 0, "recycled": 0, "discarded": 0,
+                         "crashed": 0, "browser_launches": 0}
+        self._playwright = None
+        self._browser = None
+        self.blocker = ResourceBlocker()
+        # Background recycles; the loop only keeps weak references to its tasks
+        self._tasks = set()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="browser-pool", daemon=True)
+        self._thread.start()
+        self.run(self._start())
+
+    def submit(self, coro):
+        """schedules a coroutine on the pool's loop; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """runs a coroutine on the pool's loop and blocks until it finishes"""
+        return self.submit(coro).result()
+
+    def _count(self, name, delta=1):
+        with self._lock:
+            self._metrics[name] += delta
+
+    async def _start(self):
+        self._idle = asyncio.Queue()
+        self._browser_lock = asyncio.Lock()
+        self._playwright = await async_playwright().start()
+        for slot in await asyncio.gather(*(self._warm() for _ in range(self.size))):
+            self._idle.put_nowait(slot)
+
+    async def _ensure_browser(self):
+        async with self._browser_lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._browser is not None:
+                    print("Pooled browser disconnected, relaunching")
+                self._browser = await self._playwright.chromium.launch(headless=self.headless)
+                self._count("browser_launches")
+            return self._browser
+
+    async def _warm(self):
+        browser = await self._ensure_browser()
+        context = await browser.new_context()
         try:
-            print(f"Clicking listing {start_index + scraped_count + 1}...")
-            for attempt in range(3):
-                try:
-                    listing.click(timeout=60000)
-                    break
-                except Exception as e:
-                    print(f"Attempt {attempt + 1} failed: {e}")
-                    if attempt == 2:
-                        raise e
-                    time.sleep(5)
-
-            page.wait_for_timeout(5000)
-            time.sleep(2)
-
-            name_selector = 'h1.DUwDvf'
-            if page.query_selector(name_selector) is None:
-                print(f"Could not load detailed page for business {start_index + scraped_count + 1}")
-                scraped_count += 1
-                page.go_back()
-                page.wait_for_timeout(5000)
-                continue
-
-            captcha_selector = 'div[aria-label="CAPTCHA"]'
-            if page.query_selector(captcha_selector):
-                raise Exception("CAPTCHA detected. Please solve the CAPTCHA manually or consider using the Google Maps API.")
+            if BLOCKING_ENABLED:
+                # Catches the warm-up; scrapes install their own blocker on the page, which takes precedence
+                await self.blocker.install(context)
+            page = await context.new_page()
+            slot = PooledPage(context, page)
+            page.on("crash", lambda _: setattr(slot, "broken", True))
+            with step_timer.step("home_page"):
+                await page.goto("https://www.google.com/maps", timeout=60000, wait_until="domcontentloaded")
+        except BaseException:
+            await context.close()
+            raise
+        self._count("created")
+        return slot
+
+    async def _replace(self, slot):
+        """returns a new warm slot; if warming fails the old one goes back (still marked broken)"""
+        try:
+            await slot.context.close()
+        except Exception:
+            pass
+        try:
+            return await self._warm()
+        except BaseException:
+            slot.broken = True
+            self._idle.put_nowait(slot)
+            raise
 
-            business.name = page.evaluate('() => document.querySelector("h1.DUwDvf").innerText')
-            print(f"Extracted name: {business.name}")
-
-            address_selector = 'div.Io6YTe'
-            address_elements = page.query_selector_all(address_selector)
-            business.address = ""
-            for element in address_elements:
-                text = element.inner_text()
-                if "Sukkur" in text or "Pakistan" in text:
-                    business.address = text
-                    print(f"Extracted address: {business.address}")
-                    break
-
-            website_selector = 'a[href*="http"][class*="CsEnBe"]'
-            website_element = page.query_selector(website_selector)
-            business.website = website_element.get_attribute("href") if website_element else ""
-            if business.website:
-                print(f"Extracted website: {business.website}")
-
-            phone_selector = 'div.Io6YTe'
-            phone_elements = page.query_selector_all(phone_selector)
-            business.phone_number = ""
-            for element in phone_elements:
-                text = element.inner_text()
-                if text.startswith("+92"):
-                    business.phone_number = text
-                    print(f"Extracted phone: {business.phone_number}")
-                    break
-
-            reviews_selector = 'span.F7nice span[aria-label]'
-            reviews_element = page.query_selector(reviews_selector)
-            if reviews_element:
-                aria_label = reviews_element.get_attribute("aria-label")
-                if aria_label:
-                    parts = aria_label.split()
-                    if len(parts) >= 3:
-                        business.reviews_average = float(parts[0].replace(",", ".").strip())
-                        business.reviews_count = int(parts[2].strip())
-                        print(f"Extracted reviews: {business.reviews_count} reviews, {business.reviews_average} average")
-                    else:
-                        business.reviews_average = ""
-                        business.reviews_count = ""
-                else:
-                    business.reviews_average = ""
-                    business.reviews_count = ""
+    async def _recycle(self, slot):
+        try:
+            self._idle.put_nowait(await self._replace(slot))
+        except Exception as e:
+            print(f"Could not recycle pooled page: {e}")
+
+    @asynccontextmanager
+    async def page(self):
+        """checks out a warm page; must be used on the pool's loop"""
+        slot = await self._idle.get()
+        if slot.broken or slot.page.is_closed() or not self._browser.is_connected():
+            self._count("crashed")
+            slot = await self._replace(slot)
+        self._count("checkouts")
+        self._count("in_use")
+        try:
+            yield slot.page
+        except BaseException:
+            # A failed or cancelled scrape leaves the page (and maybe its cookies) in an unknown state
+            slot.broken = True
+            raise
+        finally:
+            self._count("in_use", -1)
+            slot.uses += 1
+            if slot.broken or slot.uses >= self.max_uses:
+                self._count("discarded" if slot.broken else "recycled")
+                task = self.loop.create_task(self._recycle(slot))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
             else:
-                business.reviews_average = ""
-                business.reviews_count = ""
+                self._idle.put_nowait(slot)
+
+    def metrics(self):
+        """pool occupancy and lifetime counters"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics["size"] = self.size
+        metrics["idle"] = self._idle.qsize()
+        metrics["warmup_blocked"] = self.blocker.summary()["blocked"]
+        return metrics
+
+    async def _stop(self):
+        while not self._idle.empty():
+            slot = self._idle.get_nowait()
+            try:
+                await slot.context.close()
+            except Exception:
+                pass
+        if self._browser is not None:
+            await self._browser.close()
+        await self._playwright.stop()
+
+    def close(self):
+        if not self.loop.is_running():
+            return
+        try:
+            self.submit(self._stop()).result(timeout=30)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
 
-        except Exception as e:
-            print(f"Error scraping business {start_index + scraped_count + 1}: {e}")
-            scraped_count += 1
-            page.go_back()
-            page.wait_for_timeout(5000)
-            continue
 
-        if business.name:
-            print(f"Scraped business {start_index + scraped_count + 1}: {business.name}")
-            business_list.business_list.append(business)
-            total_scraped += 1
-        else:
-            print(f"Skipping business {start_index + scraped_count + 1}: No name found")
+_default_pool = None
+_default_pool_lock = threading.Lock()
 
-        scraped_count += 1
-        page.go_back()
-        page.wait_for_timeout(10000)
 
-    return business_list, scraped_count
+def get_browser_pool():
+    """the process-wide pool used by scrape(), started on first use and closed at exit"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = BrowserPool()
+            atexit.register(_default_pool.close)
+        return _default_pool
 
 
-def scrape(search_for, num_to_scrape=5):
-    """Main function to scrape businesses, modified for Flask"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_filename = f"google_maps_data_{timestamp}"
+# Listings harvested beyond num_to_scrape, scraped only to replace failed or nameless places
+HARVEST_SPARE = int(os.getenv("MAPS_HARVEST_SPARE", "5"))
+
+
+async def _scrape_search(open_page, search_for, num_to_scrape, workers, warm, skip=(), on_result=None):
+    """Harvests the search's place URLs on one page and scrapes them, in parallel pages when workers > 1"""
+    listing_xpath = SELECTORS["listing"]
+    # One blocker per search, so its counts are this scrape's even on shared pooled pages
+    blocker = ResourceBlocker() if BLOCKING_ENABLED else None
+    if blocker:
+        open_page = blocker.wrap(open_page)
+    try:
+        async with open_page() as page:
+            if not warm:
+                with step_timer.step("home_page"):
+                    await page.goto("https://www.google.com/maps", timeout=60000, wait_until="domcontentloaded")
+
+            # Scrolling stops once num_to_scrape places, plus a few spares for places that fail, are known
+            urls = await load_listings(page, search_for, listing_xpath, max_listings=num_to_scrape + HARVEST_SPARE)
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)  # Headless for web app
-        context = browser.new_context()
-        page = context.new_page()
+            if skip:
+                print(f"Skipping {sum(1 for url in urls if url in skip)} places scraped by an earlier run")
+            if workers <= 1:
+                return await scrape_businesses(page, urls, skip, on_result, num_to_scrape)
 
-        page.goto("https://www.google.com/maps", timeout=60000)
-        page.wait_for_timeout(5000)
+        # The feed page is released first, so a small pool can hand it to a worker
+        print(f"Scraping up to {num_to_scrape} of {len(urls)} places with {workers} workers")
+        return await scrape_urls(open_page, urls, workers, skip, on_result, num_to_scrape)
+    finally:
+        if blocker:
+            blocker.report()
 
-        listing_xpath = '//a[contains(@href, "https://www.google.com/maps/place")]'
-        load_listings(page, search_for, listing_xpath, max_listings=20)
 
-        business_list, _ = scrape_businesses(page, listing_xpath, 0, num_to_scrape)
+# Place URLs carry the pin's coordinates, e.g. ".../data=!4m7!3m6!...!3d24.8607!4d67.0011!16s..."
+PLACE_COORDINATES_RE = re.compile(r"!3d(-?\d+(?:\.\d+)?)!4d(-?\d+(?:\.\d+)?)")
 
-        # Save to both CSV and Excel
-        if business_list.business_list:
-            business_list.save_to_csv(output_filename)
-            business_list.save_to_excel(output_filename)
 
-        context.close()
-        browser.close()
+def place_source_key(url):
+    """entity-resolution key of a listing: its place URL without the query string"""
+    return "maps", url.split("?", 1)[0]
 
-    return business_list, output_filename
\ No newline at end of file
+
+def place_record(url, business):
+    """the business with the coordinates from its place URL, for entity resolution"""
+    match = PLACE_COORDINATES_RE.search(url)
+    if not match:
+        return business
+    return replace(business, latitude=float(match.group(1)), longitude=float(match.group(2)))
+
+
+async def scrape_async(search_for, num_to_scrape=5, workers=1, browser=None, output_filename=None, pool=None,
+                       resume=False, formats=OUTPUT_FORMATS):
+    """Scrapes one search and saves it in each of `formats` (csv, jsonl, parquet, xlsx)
+
+    Pages come from `pool` when given (run this on pool.loop), otherwise from a
+    new context on `browser`, launching one for this call if that is None too.
+    With workers > 1 the place URLs are collected first and scraped by that
+    many pages in parallel.
+
+    Every place is checkpointed and its row appended to the CSV, JSONL and
+    Parquet outputs as soon as it is scraped; Excel is written once at the
+    end. With resume=True a search that was interrupted continues in the same
+    output files and skips the places it already has.
+    """
+    if pool is None and browser is None:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)  # Headless for web app
+            try:
+                return await scrape_async(search_for, num_to_scrape, workers, browser, output_filename,
+                                          resume=resume, formats=formats)
+            finally:
+                await browser.close()
+
+    if output_filename is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_filename = f"google_maps_data_{timestamp}"
+    checkpoint = ScrapeCheckpoint()
+    output_filename, done = checkpoint.start(search_for, output_filename, resume)
+
+    parquet = exporters.ParquetAppender(f"{output_filename}.parquet", arrow_schema(MAPS_COLUMNS)) if "parquet" in formats else None
+    write_lock = asyncio.Lock()
+
+    def append_outputs(url, business):
+        if "csv" in formats:
+            BusinessList([business]).save_to_csv(output_filename, append=True)
+        if "jsonl" in formats:
+            BusinessList([business]).save_to_jsonl(output_filename, append=True)
+        if parquet:
+            parquet.append([business.to_dict(MAPS_COLUMNS)])
+        # The entity index is a side output: a write error there must not lose the scraped row
+        if entities.ENTITY_RESOLUTION:
+            try:
+                entities.index.add(place_record(url, business), [place_source_key(url)])
+            except sqlite3.Error as e:
+                print(f"Entity index write failed for {business.name}: {e}")
+
+    async def on_result(position, url, business):
+        if business:
+            # Off the event loop so other searches keep running; one writer at a time
+            async with write_lock:
+                await asyncio.to_thread(append_outputs, url, business)
+        # Only marked done once its rows are written, so a crash in between scrapes it again on resume
+        checkpoint.record(search_for, url, position, business)
+
+    print(f"Using Google Maps selector table v{SELECTOR_TABLE['version']}")
+    try:
+        if pool is not None:
+            # Workers beyond the pool's pages would only wait for a page and find the queue empty
+            if workers > pool.size:
+                print(f"Using {pool.size} workers instead of {workers}: the browser pool has {pool.size} pages (MAPS_POOL_SIZE)")
+                workers = pool.size
+            await _scrape_search(pool.page, search_for, num_to_scrape, workers, True, done, on_result)
+        else:
+            # Each search gets its own context (cookies, cache) even when the browser is shared
+            context = await browser.new_context()
+            try:
+                await _scrape_search(lambda: context_page(context), search_for, num_to_scrape, workers, False, done, on_result)
+            finally:
+                await context.close()
+    finally:
+        if parquet:
+            parquet.close()
+
+    # Includes the places of earlier runs; the appended outputs are already complete
+    business_list = checkpoint.business_list(search_for)
+    if business_list.business_list and "xlsx" in formats:
+        await asyncio.to_thread(business_list.save_to_excel, output_filename)
+
+    return business_list, output_filename
+
+
+async def scrape_many(searches, num_to_scrape=5, concurrency=2, workers=1, pool=None, resume=False):
+    """Runs several searches in one event loop, sharing a single browser
+
+    At most `concurrency` searches are in flight at once. With a `pool` (run
+    this on pool.loop) its warm pages are used, otherwise a browser is launched
+    for the call. Returns one entry per search, in order: (business_list,
+    output_filename), or the exception that search failed with (e.g. a
+    CAPTCHA). Cancelling the task running this coroutine cancels every search
+    and closes their pages; resume=True picks them up where they stopped.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    limit = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(index, search_for, browser):
+        async with limit:
+            return await scrape_async(search_for, num_to_scrape, workers, browser,
+                                      output_filename=f"google_maps_data_{timestamp}_{index}", pool=pool, resume=resume)
+
+    async def run_all(browser=None):
+        return await asyncio.gather(*(run(index, search_for, browser) for index, search_for in enumerate(searches, start=1)),
+                                    return_exceptions=True)
+
+    if pool is not None:
+        results = await run_all()
+    else:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            try:
+                results = await run_all(browser)
+            finally:
+                await browser.close()
+
+    for search_for, result in zip(searches, results):
+        if isinstance(result, BaseException):
+            print(f"Search '{search_for}' failed: {result}")
+
+    print("Per-step latency:")
+    step_timer.report()
+    return results
+
+
+def scrape(search_for, num_to_scrape=5, workers=1, pool=None, resume=False):
+    """Main function to scrape businesses, modified for Flask
+
+    Blocking wrapper around scrape_async for code that does not run an event
+    loop; from async code, await scrape_async or scrape_many instead. Runs on
+    `pool`, or the process-wide warm pool, so repeated calls skip the browser
+    launch and home page load. resume=True continues an interrupted scrape of
+    the same search.
+    """
+    pool = pool or get_browser_pool()
+    business_list, output_filename = pool.run(scrape_async(search_for, num_to_scrape, workers, pool=pool, resume=resume))
+    print("Per-step latency:")
+    step_timer.report()
+    print(f"Browser pool: {pool.metrics()}")
+    return business_list, output_filename
@@ -0,0 +1,34 @@
+"""Where runtime stores (SQLite caches, checkpoints, logs) live, and how they are opened.
+
+Everything is written next to the app, or to /tmp on Render where that is
+the only writable directory. Module-level stores such as http_cache.cache or
+entities.index are opened on first use rather than at import, so importing
+a module (or running --startup-time) never creates files in the current
+directory.
+"""
+
+import os
+import threading
+
+
+DATA_DIR = '/tmp' if os.getenv('RENDER') else '.'
+
+
+def lazy_singletons(namespace, factories):
+    """module __getattr__ that builds each named store with its factory on first access
+
+    The instance is then stored in the module, so later lookups are plain
+    attribute reads. Usage: __getattr__ = lazy_singletons(globals(), {"cache": ResponseCache})
+    """
+    lock = threading.Lock()
+
+    def __getattr__(name):
+        factory = factories.get(name)
+        if factory is None:
+            raise AttributeError(f"module {namespace['__name__']!r} has no attribute {name!r}")
+        with lock:
+            if name not in namespace:
+                namespace[name] = factory()
+        return namespace[name]
+
+    return __getattr__